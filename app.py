@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from utils.google_sheets import read_sheet_to_dataframe
+from utils.google_sheets import ROW_ID_COLUMN, ensure_row_ids, get_sheet_snapshot, normalize_text, refresh_sheet_snapshot
+from utils.schemas import DASHBOARD_SCHEMA, format_value
+from utils.warmup import start_cache_warmer
 
 # --- Configurações Iniciais ---
 st.set_page_config(
@@ -14,6 +16,9 @@ st.set_page_config(
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1VZpV97NIhd16jAyzMpVE_8VhSs-bSqi4DXmySsx2Kc4/edit#gid=0"
 WORKSHEET_NAME = "Cronograma"
 
+# Aquece clientes e snapshots em segundo plano (uma vez por processo)
+start_cache_warmer(SPREADSHEET_URL)
+
 # --- Estilos CSS ---
 st.markdown("""
     <style>
@@ -105,25 +110,32 @@ with st.container():
         st.markdown(f"<div class='subheader-style'>🔑 Tipo: {st.session_state.tipo_usuario}</div>", unsafe_allow_html=True)
     with cols[3]:
         if st.button("🔄 Atualizar", help="Atualizar dados da planilha"):
-            st.cache_data.clear()
+            # Só o Cronograma do painel, no máximo uma vez a cada poucos segundos (e só relê os dados se a planilha mudou)
+            refresh_sheet_snapshot(SPREADSHEET_URL, WORKSHEET_NAME, schema=DASHBOARD_SCHEMA)
             st.rerun()
 
 # --- Carregamento de Dados ---
-@st.cache_data(ttl=300)
+# O snapshot da planilha é compartilhado pelo processo; aqui só se projeta a visão do usuário.
 def load_data():
     try:
-        df = read_sheet_to_dataframe(SPREADSHEET_URL, WORKSHEET_NAME)
+        snapshot = get_sheet_snapshot(SPREADSHEET_URL, WORKSHEET_NAME, schema=DASHBOARD_SCHEMA)
+        if snapshot is None:
+            return None
+        df = snapshot.dataframe
         if df.empty:
             st.warning("A planilha está vazia!")
             return None
+
+        # Linhas novas ainda sem ID recebem um antes de serem exibidas (uma escrita em lote)
+        if ROW_ID_COLUMN in df.columns and (df[ROW_ID_COLUMN] == "").any():
+            if ensure_row_ids(SPREADSHEET_URL, WORKSHEET_NAME, row_count=len(df)):
+                snapshot = get_sheet_snapshot(SPREADSHEET_URL, WORKSHEET_NAME, schema=DASHBOARD_SCHEMA) # Já contém os IDs gravados
+                df = snapshot.dataframe
             
-        # Filtra por e-mail do usuário logado
+        # Filtra por e-mail do usuário logado ('e-mail'/'Email' já chegam como 'E-mail', ver DASHBOARD_SCHEMA)
         if "email" in st.session_state:
-            user_email = str(st.session_state.email).strip().lower()
             if 'E-mail' in df.columns:
-                df = df[df['E-mail'].str.lower() == user_email]
-            elif 'e-mail' in df.columns:
-                df = df[df['e-mail'].str.lower() == user_email]
+                df = snapshot.select('E-mail', st.session_state.email, normalize=normalize_text)
             else:
                 st.error("Coluna de e-mail não encontrada na planilha.")
                 
@@ -233,7 +245,7 @@ if df is not None:
                             <p><strong>Setor:</strong> {row['Setor']}</p>
                             <p><strong>Responsável:</strong> {row['Responsável']}</p>
                             <p><strong>Responsável Área:</strong> {row['Responsável Área']}</p>
-                            <p><strong>E-mail:</strong> {row.get('E-mail', row.get('e-mail', 'N/A'))}</p>
+                            <p><strong>E-mail:</strong> {row.get('E-mail', 'N/A')}</p>
                         </div>
                     """, unsafe_allow_html=True)
                 
@@ -261,14 +273,15 @@ if df is not None:
                                             justify-content: space-between;
                                             overflow: auto;  /* Adiciona scroll se necessário */
                                         ">
-                                            <p style="margin: 0;"><strong>{entrega.split('º')[0]}º Entrega:</strong> {row[entrega]}</p>
-                                            <p style="margin: 0;"><strong>→ </strong> {row[avaliacao]}</p>
-                                            <p style="margin: 0;"><strong>Status: </strong> {row[validacao]}</p>
+                                            <p style="margin: 0;"><strong>{entrega.split('º')[0]}º Entrega:</strong> {format_value(row[entrega])}</p>
+                                            <p style="margin: 0;"><strong>→ </strong> {format_value(row[avaliacao])}</p>
+                                            <p style="margin: 0;"><strong>Status: </strong> {format_value(row[validacao])}</p>
                                         </div>
                                     """, unsafe_allow_html=True)
                         
                         if st.button(f"✏️ {entrega.split('º')[0]}º", key=f"editar_{i}_entrega_{index} Entrega"):
-                            st.session_state.selected_row_index = index
+                            # O ID identifica a linha mesmo se a planilha for reordenada; sem a coluna, usa a posição
+                            st.session_state.selected_row_key = row.get(ROW_ID_COLUMN) or index
                             st.switch_page(page)
                 
                 st.markdown("</div>", unsafe_allow_html=True)
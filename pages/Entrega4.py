@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import io
 import re
 import sys # Standard library
 import os  # Standard library
@@ -23,12 +22,10 @@ except NameError:
     pass
 
 # --- Local application imports ---
-from utils.google_sheets import read_sheet_to_dataframe, update_cell_in_sheet # Funções do seu módulo utils
+from utils.google_sheets import read_sheet_row, update_cell_in_sheet # Funções do seu módulo utils
+from utils.write_behind import enqueue_cell_update, get_cell_update_status, get_pending_value, STATUS_PENDING, STATUS_SAVED, STATUS_FAILED
 
-# --- Third-party imports for Google APIs ---
-from googleapiclient.discovery import build # Para Google Drive
-from googleapiclient.http import MediaIoBaseUpload # Para Google Drive
-from oauth2client.service_account import ServiceAccountCredentials # Para Google Drive
+from utils.google_drive import get_drive_service, upload_document_and_link # Google Drive
 
 
 # --- Constantes Específicas da Entrega ---
@@ -36,6 +33,7 @@ ENTREGA_NUM = 4
 AVALIACAO_COL_NAME = f'{ENTREGA_NUM}º Avaliação'
 DOC_COL_NAME = f'Doc{ENTREGA_NUM}'
 PAGE_TITLE = f"📝 Gerenciar {ENTREGA_NUM}ª Entrega"
+WRITE_BEHIND_ENABLED = False # True: a avaliação é enfileirada e gravada em segundo plano (a tela não espera a planilha)
 
 # --- Constantes Globais (podem vir de um config ou serem repetidas) ---
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1VZpV97NIhd16jAyzMpVE_8VhSs-bSqi4DXmySsx2Kc4/edit#gid=761491838" # URL base da planilha
@@ -136,24 +134,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# --- Configuração de Credenciais do Google para Drive (usando st.secrets) ---
-@st.cache_resource(ttl=3600) # Cacheia por 1 hora
-def get_drive_service():
-    scope_drive = ['https://www.googleapis.com/auth/drive']
-    if "gcp_service_account" in st.secrets:
-        creds_dict = st.secrets["gcp_service_account"]
-        try:
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope_drive)
-            service = build('drive', 'v3', credentials=creds)
-            return service
-        except Exception as e:
-            st.error(f"Erro ao autenticar com Google Drive via st.secrets: {e}")
-            st.stop()
-    else:
-        st.error("Credenciais 'gcp_service_account' não encontradas nos Segredos do Streamlit para o Google Drive.")
-        st.stop()
-
+# --- Serviço do Google Drive (cacheado em utils.google_drive) ---
 drive_service = get_drive_service()
+if not drive_service:
+    st.stop()
 
 # --- Verificação de Login e Seleção de Linha ---
 if not st.session_state.get("logged_in", False):
@@ -161,31 +145,26 @@ if not st.session_state.get("logged_in", False):
     if st.button("🔐 Fazer login"): st.switch_page("pages/auth.py")
     st.stop()
 
-if "selected_row_index" not in st.session_state:
+if "selected_row_key" not in st.session_state:
     st.error("Nenhuma meta selecionada. Volte para a página principal e selecione uma meta para gerenciar suas entregas.")
     if st.button("⬅️ Voltar para o Painel"): st.switch_page("app.py")
     st.stop()
 
 # --- Carregamento de Dados da Linha Selecionada (Apenas Cronograma) ---
-@st.cache_data(ttl=300) # Cache para os dados da planilha
-def load_cronograma_data(sheet_url, worksheet_name_cronograma):
-    df_cronograma = read_sheet_to_dataframe(sheet_url, worksheet_name_cronograma)
-    return df_cronograma
+# Busca só a linha selecionada, pelo ID. A linha fica em cache no processo por revisão da planilha (ver read_sheet_row):
+# as reexecuções da página não fazem requisições, e as gravações abaixo atualizam a cópia em cache.
+selected_key = st.session_state.selected_row_key
+row_data_cronograma = read_sheet_row(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, selected_key)
 
-df_all_cronograma = load_cronograma_data(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME)
-
-if df_all_cronograma is None or df_all_cronograma.empty:
+if row_data_cronograma is None:
     st.error("Não foi possível carregar os dados da aba 'Cronograma'. Verifique as configurações.")
     st.stop()
 
-selected_idx = st.session_state.selected_row_index
-if selected_idx >= len(df_all_cronograma):
+if row_data_cronograma.empty:
     st.error("O item selecionado não existe mais ou a planilha 'Cronograma' foi alterada. Por favor, volte e selecione novamente.")
     if st.button("⬅️ Voltar para o Painel"): st.switch_page("app.py")
     st.stop()
 
-row_data_cronograma = df_all_cronograma.iloc[selected_idx]
-
 # --- Layout da Página ---
 header_cols = st.columns([8,2])
 with header_cols[0]:
@@ -239,18 +218,42 @@ with st.container():
 with st.container():
     st.markdown("<div class='content-section'>", unsafe_allow_html=True)
     st.markdown(f"<h3>✏️ Avaliação da {ENTREGA_NUM}ª Entrega</h3>", unsafe_allow_html=True)
+    # Valor que o usuário tinha na tela ao começar a editar (guardado a cada renderização):
+    # a gravação só acontece se a célula ainda tiver esse valor na planilha.
+    avaliacao_base_key = f"avaliacao_base_e{ENTREGA_NUM}"
     with st.form(f"form_avaliacao_entrega{ENTREGA_NUM}"):
-        current_avaliacao = row_data_cronograma.get(AVALIACAO_COL_NAME, '')
+        current_avaliacao = get_pending_value(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, selected_key, AVALIACAO_COL_NAME,
+                                              default=row_data_cronograma.get(AVALIACAO_COL_NAME, ''))
+        base_avaliacao = st.session_state.get(avaliacao_base_key, {}).get(selected_key, current_avaliacao)
         new_avaliacao = st.text_area("Insira sua avaliação ou observações:", value=current_avaliacao, height=100, key=f"text_aval_e{ENTREGA_NUM}")
         submitted_avaliacao = st.form_submit_button(f"💾 Salvar Avaliação da {ENTREGA_NUM}ª Entrega")
 
         if submitted_avaliacao:
-            if update_cell_in_sheet(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, df_all_cronograma, selected_idx, AVALIACAO_COL_NAME, new_avaliacao):
-                st.success(f"Avaliação da {ENTREGA_NUM}ª Entrega atualizada com sucesso!")
-                st.cache_data.clear() 
-                st.rerun() 
+            if WRITE_BEHIND_ENABLED:
+                enqueue_cell_update(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, selected_key, AVALIACAO_COL_NAME, new_avaliacao)
             else:
-                st.error(f"Falha ao atualizar a avaliação da {ENTREGA_NUM}ª Entrega.")
+                update_result = update_cell_in_sheet(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, None, selected_key, AVALIACAO_COL_NAME,
+                                                     new_avaliacao, expected_value=base_avaliacao)
+                if update_result:
+                    st.success(f"Avaliação da {ENTREGA_NUM}ª Entrega atualizada com sucesso!")
+                    st.session_state.pop(avaliacao_base_key, None)
+                    st.rerun() # O snapshot compartilhado já foi atualizado com o novo valor
+                elif update_result.conflict:
+                    current_avaliacao = update_result.current_value # Nova base: o próximo salvamento substitui o valor atual
+                    st.warning(f"A avaliação foi alterada por outra pessoa enquanto você editava. Valor atual na planilha: "
+                               f"\"{update_result.current_value}\". Revise o texto e salve novamente para substituí-lo.")
+                else:
+                    st.error(f"Falha ao atualizar a avaliação da {ENTREGA_NUM}ª Entrega.")
+    st.session_state[avaliacao_base_key] = {selected_key: current_avaliacao}
+
+    if WRITE_BEHIND_ENABLED:
+        save_status, save_error = get_cell_update_status(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, selected_key, AVALIACAO_COL_NAME)
+        if save_status == STATUS_PENDING:
+            st.info("⏳ Avaliação pendente: será gravada na planilha em instantes.")
+        elif save_status == STATUS_SAVED:
+            st.success("✅ Avaliação salva na planilha.")
+        elif save_status == STATUS_FAILED:
+            st.error(f"Falha ao gravar a avaliação na planilha: {save_error}")
     st.markdown("</div>", unsafe_allow_html=True)
 
 
@@ -259,39 +262,41 @@ with st.container():
     st.markdown("<div class='content-section'>", unsafe_allow_html=True)
     st.markdown(f"<h3>📎 Documento da {ENTREGA_NUM}ª Entrega</h3>", unsafe_allow_html=True)
 
-    def upload_to_drive(file_to_upload, drive_filename, drive_mimetype):
-        try:
-            file_metadata = {'name': drive_filename, 'parents': [GOOGLE_DRIVE_FOLDER_ID]}
-            media = MediaIoBaseUpload(io.BytesIO(file_to_upload.read()), mimetype=drive_mimetype, resumable=True)
-            uploaded_file_drive = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
-            
-            file_id = uploaded_file_drive.get('id')
-            permission = {'type': 'anyone', 'role': 'reader'} 
-            drive_service.permissions().create(fileId=file_id, body=permission).execute()
-            return uploaded_file_drive.get('webViewLink')
-        except Exception as e_drive:
-            st.error(f"Erro ao fazer upload para o Google Drive: {e_drive}")
-            return None
-
     uploaded_file_st = st.file_uploader(f"Selecione um arquivo para a {ENTREGA_NUM}ª Entrega (PDF, DOCX, XLSX, etc.)", 
                                         type=["pdf", "docx", "doc", "xlsx", "xls", "txt", "png", "jpg", "jpeg", "ppt", "pptx"], 
                                         key=f"uploader_e{ENTREGA_NUM}")
 
+    # Resultado do último envio bem-sucedido, guardado antes do st.rerun() para continuar visível
+    upload_feedback_key = f"upload_feedback_e{ENTREGA_NUM}"
+    upload_feedback = st.session_state.pop(upload_feedback_key, None)
+    if upload_feedback:
+        st.success(f"Documento '{upload_feedback['filename']}' enviado com sucesso! Link atualizado na planilha.")
+        if upload_feedback["timings"]:
+            st.caption(f"Tempos do envio: {upload_feedback['timings']}")
+
     if uploaded_file_st is not None:
         if st.button(f"📤 Enviar Documento da {ENTREGA_NUM}ª Entrega", key=f"btn_upload_e{ENTREGA_NUM}"):
             with st.spinner(f"Enviando {uploaded_file_st.name}..."):
-                gdrive_link = upload_to_drive(uploaded_file_st, uploaded_file_st.name, uploaded_file_st.type)
+                # Upload, permissão de leitura e gravação do link na planilha (as duas últimas em paralelo)
+                upload_result = upload_document_and_link(uploaded_file_st.getvalue(), uploaded_file_st.name, uploaded_file_st.type,
+                                                         GOOGLE_DRIVE_FOLDER_ID, SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME,
+                                                         selected_key, DOC_COL_NAME)
             
-            if gdrive_link:
-                if update_cell_in_sheet(SPREADSHEET_URL, WORKSHEET_CRONOGRAMA_NAME, df_all_cronograma, selected_idx, DOC_COL_NAME, gdrive_link):
-                    st.success(f"Documento '{uploaded_file_st.name}' enviado com sucesso! Link atualizado na planilha.")
-                    st.markdown(f"**Link do arquivo:** [{gdrive_link}]({gdrive_link})")
-                    st.cache_data.clear() 
-                    st.rerun()
-                else:
-                    st.error("Documento enviado para o Drive, mas falha ao atualizar o link na planilha.")
+            if upload_result:
+                st.session_state[upload_feedback_key] = {
+                    "filename": uploaded_file_st.name,
+                    "timings": upload_result.timings_text() if upload_result.timings else None,
+                }
+                st.rerun() # O link novo aparece na seção abaixo
+            elif upload_result.link is None:
+                st.error(upload_result.error or "Falha no upload do documento para o Google Drive.")
             else:
-                st.error("Falha no upload do documento para o Google Drive.")
+                if upload_result.error:
+                    st.error(upload_result.error)
+                if not upload_result.sheet_ok:
+                    st.error("Documento enviado para o Drive, mas falha ao atualizar o link na planilha.")
+            if upload_result.timings:
+                st.caption(f"Tempos do envio: {upload_result.timings_text()}")
     
     current_doc_link = row_data_cronograma.get(DOC_COL_NAME)
     if pd.notna(current_doc_link) and "drive.google.com" in str(current_doc_link):
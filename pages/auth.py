@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from utils.google_sheets import read_sheet_to_dataframe, append_row_to_sheet # Funções do seu módulo utils
+from utils.google_sheets import append_row_to_sheet, get_sheet_revision, get_sheet_snapshot, peek_sheet_snapshot, read_sheets_batch, seed_sheet_snapshot # Funções do seu módulo utils
+from utils.schemas import CRONOGRAMA_SHEET_NAME, DASHBOARD_SCHEMA, USERS_SCHEMA
+from utils.warmup import start_cache_warmer
 from datetime import datetime
 # Removido gspread e ServiceAccountCredentials daqui, pois a interação com sheets deve ser via utils
 
@@ -8,6 +10,9 @@ from datetime import datetime
 SPREADSHEET_URL_USERS = "https://docs.google.com/spreadsheets/d/1VZpV97NIhd16jAyzMpVE_8VhSs-bSqi4DXmySsx2Kc4/edit#gid=0" # URL específica da aba Usuários
 USERS_SHEET_NAME = "Usuários"
 
+# Aquece clientes e snapshots em segundo plano (uma vez por processo)
+start_cache_warmer(SPREADSHEET_URL_USERS)
+
 # --- Estilos CSS para a Página de Autenticação ---
 st.markdown("""
     <style>
@@ -101,11 +106,34 @@ def authenticate_user(login_input, senha_input, df_users_auth):
         return user.iloc[0].to_dict()
     return None
 
+def load_users_and_dashboard():
+    """
+    Lê a aba Usuários e as colunas do painel do Cronograma em uma única requisição. Ambas são
+    registradas como snapshots compartilhados (Usuários só em memória, pois contém senhas), de
+    modo que app.py abre após o login sem nova leitura. Se o aquecedor (utils.warmup) já deixou
+    os dois snapshots prontos, nenhuma requisição é feita.
+    """
+    users = peek_sheet_snapshot(SPREADSHEET_URL_USERS, USERS_SHEET_NAME, schema=USERS_SCHEMA)
+    if users is not None and peek_sheet_snapshot(SPREADSHEET_URL_USERS, CRONOGRAMA_SHEET_NAME, schema=DASHBOARD_SCHEMA) is not None:
+        return users.dataframe
+
+    revision = get_sheet_revision(SPREADSHEET_URL_USERS) # Consultada antes da leitura, como em get_sheet_snapshot
+    frames = read_sheets_batch(SPREADSHEET_URL_USERS, {USERS_SHEET_NAME: USERS_SCHEMA.read_columns,
+                                                       CRONOGRAMA_SHEET_NAME: DASHBOARD_SCHEMA.read_columns})
+    if frames.get(CRONOGRAMA_SHEET_NAME) is not None:
+        seed_sheet_snapshot(SPREADSHEET_URL_USERS, CRONOGRAMA_SHEET_NAME, frames[CRONOGRAMA_SHEET_NAME], revision,
+                            schema=DASHBOARD_SCHEMA)
+    if frames.get(USERS_SHEET_NAME) is None:
+        return None
+    # O snapshot guarda a versão tipada (com 'E-mail'/'e-mail' já resolvidos como 'Email'), compartilhada pelas sessões
+    return seed_sheet_snapshot(SPREADSHEET_URL_USERS, USERS_SHEET_NAME, frames[USERS_SHEET_NAME], revision,
+                               persist=False, schema=USERS_SCHEMA).dataframe
+
 # --- Inicialização da sessão ---
 if "logged_in" not in st.session_state:
     st.session_state["logged_in"] = False
 if "df_users" not in st.session_state: # Cache simples dos usuários para evitar releitura constante
-    st.session_state.df_users = read_sheet_to_dataframe(SPREADSHEET_URL_USERS, USERS_SHEET_NAME)
+    st.session_state.df_users = load_users_and_dashboard()
 
 
 # --- Layout da Página ---
@@ -131,7 +159,7 @@ if not st.session_state["logged_in"]:
                     if user_info:
                         st.session_state["logged_in"] = True
                         st.session_state["user_info"] = user_info
-                        st.session_state["email"] = user_info.get("Email", user_info.get("E-mail")) # Lida com variações de nome de coluna
+                        st.session_state["email"] = user_info.get("Email") # 'E-mail'/'e-mail' já chegam como 'Email' (ver USERS_SCHEMA)
                         st.session_state["tipo_usuario"] = user_info.get("Tipo de Usuário")
                         st.success(f"Bem-vindo(a), {user_info.get('Login')}!")
                         st.switch_page("app.py") # Redireciona para a página principal
@@ -166,7 +194,9 @@ if not st.session_state["logged_in"]:
                     if append_row_to_sheet(SPREADSHEET_URL_USERS, USERS_SHEET_NAME, new_user_data):
                         st.success("✅ Usuário cadastrado com sucesso! Você já pode fazer o login.")
                         # Atualiza o cache local de usuários
-                        st.session_state.df_users = read_sheet_to_dataframe(SPREADSHEET_URL_USERS, USERS_SHEET_NAME)
+                        snapshot_users = get_sheet_snapshot(SPREADSHEET_URL_USERS, USERS_SHEET_NAME, persist=False,
+                                                            schema=USERS_SCHEMA) # Já inclui a linha nova
+                        st.session_state.df_users = snapshot_users.dataframe if snapshot_users is not None else None
                         # Limpar campos do formulário (Streamlit não tem um método direto, o rerun do form ajuda)
                     else:
                         st.error("❌ Ocorreu um erro ao cadastrar o usuário. Tente novamente.")
@@ -0,0 +1,48 @@
+"""
+Compara o tempo e a memória da montagem do DataFrame a partir das linhas da planilha:
+laço por linha (implementação anterior) x _rows_to_dataframe, com e sem colunas de categoria.
+
+Uso: python tests/benchmark_rows_to_dataframe.py [linhas] [colunas]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.google_sheets import _apply_dtypes, _rows_to_dataframe
+from test_rows_to_dataframe import _rows_to_dataframe_loop
+
+
+def _ragged_rows(num_rows, num_cols, seed=0):
+    """Linhas com largura variável (a API omite células vazias no fim da linha) e poucos valores nas 3 primeiras colunas."""
+    rng = random.Random(seed)
+    setores = [f"Setor {i}" for i in range(12)]
+    rows = []
+    for r in range(num_rows):
+        width = rng.randint(num_cols - 5, num_cols + 2)
+        row = [rng.choice(setores) if c < 3 else f"valor {r}-{c}" for c in range(width)]
+        rows.append(row)
+    return rows
+
+def _measure(label, build):
+    start = time.perf_counter()
+    df = build()
+    elapsed = time.perf_counter() - start
+    megabytes = df.memory_usage(deep=True, index=False).sum() / 1e6
+    print(f"{label:<40} {elapsed:7.3f} s {megabytes:8.1f} MB")
+    return df
+
+def main(num_rows=30000, num_cols=40):
+    headers = [f"Coluna {c}" for c in range(num_cols)]
+    rows = _ragged_rows(num_rows, num_cols)
+    dtypes = {headers[0]: "category", headers[1]: "category", headers[2]: "category"}
+    print(f"{num_rows} linhas x {num_cols} colunas")
+    _measure("laço por linha", lambda: _rows_to_dataframe_loop(rows, headers))
+    _measure("vetorizado", lambda: _rows_to_dataframe(rows, headers))
+    _measure("vetorizado + 3 colunas categoria", lambda: _apply_dtypes(_rows_to_dataframe(rows, headers), dtypes))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Permite importar o pacote utils ao rodar o pytest a partir de qualquer diretório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
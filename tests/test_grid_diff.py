@@ -0,0 +1,64 @@
+import gspread
+import numpy as np
+import pandas as pd
+
+from utils.google_sheets import _grid_diff_ranges, _text_grid
+
+
+def _grid(rows):
+    width = max((len(row) for row in rows), default=0)
+    return np.array([row + [""] * (width - len(row)) for row in rows], dtype=object).reshape(len(rows), width)
+
+def _apply(current, data):
+    """Aplica os intervalos de _grid_diff_ranges a uma cópia da grade, como o values.batchUpdate faria."""
+    updates = []
+    for item in data:
+        first, last = item["range"].split("!")[1].split(":")
+        (row, first_col), (_, last_col) = gspread.utils.a1_to_rowcol(first), gspread.utils.a1_to_rowcol(last)
+        updates.append((row - 1, first_col - 1, last_col, item["values"][0]))
+    num_rows = max([current.shape[0]] + [row + 1 for row, _, _, _ in updates])
+    num_cols = max([current.shape[1]] + [last_col for _, _, last_col, _ in updates])
+    grid = np.full((num_rows, num_cols), "", dtype=object)
+    grid[:current.shape[0], :current.shape[1]] = current
+    for row, first_col, last_col, values in updates:
+        grid[row, first_col:last_col] = values
+    return grid
+
+def _assert_written(current, dataframe):
+    """Depois da escrita, a planilha tem exatamente o DataFrame (e só células vazias fora dele)."""
+    target = _text_grid(dataframe)
+    result = _apply(current, _grid_diff_ranges("Aba", current, target))
+    assert (result[:target.shape[0], :target.shape[1]] == target).all()
+    assert (result[target.shape[0]:, :] == "").all() and (result[:, target.shape[1]:] == "").all()
+
+
+def test_text_grid_nan_and_none_become_empty_text():
+    df = pd.DataFrame({"ID": ["1", "2"], "Valor": [1.5, np.nan], "Obs": [None, "x"]})
+    assert _text_grid(df).tolist() == [["ID", "Valor", "Obs"], ["1", "1.5", ""], ["2", "", "x"]]
+
+def test_text_grid_without_rows():
+    assert _text_grid(pd.DataFrame(columns=["ID", "A"])).tolist() == [["ID", "A"]]
+
+def test_unchanged_grid_sends_nothing():
+    current = _grid([["ID", "A"], ["1", "x"], ["2", ""]])
+    assert _grid_diff_ranges("Aba", current, _text_grid(pd.DataFrame({"ID": ["1", "2"], "A": ["x", None]}))) == []
+
+def test_only_changed_cells_are_sent_and_neighbours_merged():
+    current = _grid([["ID", "A", "B", "C"], ["1", "x", "y", "z"]])
+    data = _grid_diff_ranges("Aba", current, _text_grid(pd.DataFrame({"ID": ["1"], "A": ["X"], "B": ["Y"], "C": ["z"]})))
+    assert data == [{"range": "'Aba'!B2:C2", "values": [["X", "Y"]]}]
+
+def test_shrink_clears_removed_rows_and_columns():
+    current = _grid([["ID", "A", "B"], ["1", "x", "y"], ["2", "x", "y"], ["3", "x", "y"]])
+    _assert_written(current, pd.DataFrame({"ID": ["1"], "A": ["x"]}))
+
+def test_grow_adds_rows_and_columns():
+    current = _grid([["ID", "A"], ["1", "x"]])
+    _assert_written(current, pd.DataFrame({"ID": ["1", "2", "3"], "A": ["x", "y", "z"], "B": ["", "b", np.nan]}))
+
+def test_cells_past_the_headers_are_cleared():
+    current = _grid([["ID", "A"], ["1", "x", "solta", "outra"], ["2", "y"]])
+    _assert_written(current, pd.DataFrame({"ID": ["1", "2"], "A": ["x", "y"]}))
+
+def test_empty_sheet():
+    _assert_written(np.empty((0, 0), dtype=object), pd.DataFrame({"ID": ["1"], "A": [np.nan]}))
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+import utils.google_sheets as gs
+from utils.storage import SQLiteBackend
+
+URL = "https://docs.google.com/spreadsheets/d/TESTE/edit"
+
+
+@pytest.fixture
+def sqlite_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "app.sqlite3")
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_STORAGE_PATH", path)
+    monkeypatch.setattr(gs, "save_snapshot_in_background", lambda *args: None) # Sem cópia em disco dos snapshots
+    yield path
+    gs.invalidate_sheet_snapshot()
+    gs._row_indexes.clear()
+
+def test_conflict_refreshes_cached_row(sqlite_path):
+    gs.write_dataframe_to_sheet(URL, "Cronograma", pd.DataFrame({"ID": ["k0", "k1"], "A": ["x", "y"]}))
+    assert gs.read_sheet_row(URL, "Cronograma", "k1").get("A") == "y"
+    SQLiteBackend(sqlite_path).update_cell(URL, "Cronograma", None, 1, "A", "outro") # Outro cliente
+
+    result = gs.update_cell_in_sheet(URL, "Cronograma", None, "k1", "A", "meu", expected_value="y")
+    assert result.conflict and result.current_value == "outro"
+    # A próxima renderização já mostra o valor atual, e salvar de novo com ele como base funciona
+    base = gs.read_sheet_row(URL, "Cronograma", "k1").get("A")
+    assert base == "outro"
+    assert gs.update_cell_in_sheet(URL, "Cronograma", None, "k1", "A", "meu", expected_value=base)
+    assert gs.read_sheet_row(URL, "Cronograma", "k1").get("A") == "meu"
+
+def test_write_patches_cached_row(sqlite_path):
+    gs.write_dataframe_to_sheet(URL, "Cronograma", pd.DataFrame({"ID": ["k0", "k1"], "A": ["x", "y"]}))
+    gs.read_sheet_row(URL, "Cronograma", "k0")
+    assert gs.update_cell_in_sheet(URL, "Cronograma", None, "k0", "A", "novo", expected_value="x")
+    assert gs.read_sheet_row(URL, "Cronograma", "k0").get("A") == "novo"
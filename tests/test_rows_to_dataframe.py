@@ -0,0 +1,49 @@
+import random
+
+import pandas as pd
+import pytest
+
+from utils.google_sheets import _rows_to_dataframe
+
+
+def _rows_to_dataframe_loop(rows, headers):
+    """Implementação anterior (laço por linha), mantida aqui como referência de comportamento."""
+    processed_rows = []
+    num_headers = len(headers)
+    for row in rows:
+        row_len = len(row)
+        if row_len < num_headers:
+            processed_rows.append(row + [None] * (num_headers - row_len))
+        elif row_len > num_headers:
+            processed_rows.append(row[:num_headers])
+        else:
+            processed_rows.append(row)
+    return pd.DataFrame(processed_rows, columns=headers)
+
+
+HEADERS = ['ID', 'Referência', 'Setor', 'Responsável']
+
+@pytest.mark.parametrize("rows", [
+    [],                                                   # Aba só com cabeçalhos
+    [['1', 'R1', 'TI', 'Ana']],                           # Largura exata
+    [['1', 'R1', 'TI', 'Ana', 'extra', 'mais']],          # Linha mais larga que os cabeçalhos
+    [['1', 'R1']],                                        # Linha mais estreita que os cabeçalhos
+    [[]],                                                 # Linha vazia
+    [['1'], ['2', 'R2', 'RH', 'Bia', 'x'], ['3', 'R3']],  # Larguras misturadas
+    [['1', 'R1', 'TI', 'Ana', 'x'], ['2', 'R2', 'RH', 'Bia', 'y']], # Todas mais largas
+    [['1', 'R1'], ['2']],                                 # Todas mais estreitas
+])
+def test_same_result_as_loop(rows):
+    pd.testing.assert_frame_equal(_rows_to_dataframe(rows, HEADERS), _rows_to_dataframe_loop(rows, HEADERS))
+
+def test_same_result_as_loop_random_ragged():
+    rng = random.Random(0)
+    for _ in range(200):
+        headers = [f"c{i}" for i in range(rng.randint(1, 8))]
+        rows = [[f"v{r}.{c}" for c in range(rng.randint(0, 10))] for r in range(rng.randint(0, 15))]
+        pd.testing.assert_frame_equal(_rows_to_dataframe(rows, headers), _rows_to_dataframe_loop(rows, headers))
+
+def test_does_not_modify_rows():
+    rows = [['1', 'R1'], ['2', 'R2', 'RH', 'Bia', 'x']]
+    _rows_to_dataframe(rows, HEADERS)
+    assert rows == [['1', 'R1'], ['2', 'R2', 'RH', 'Bia', 'x']]
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import streamlit as st
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+logger = logging.getLogger(__name__)
+
+# Escopo único das credenciais compartilhadas por gspread e Drive
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+
+# Antecedência (em segundos) com que o token é renovado em segundo plano antes de expirar.
+# Deve ser maior que a margem em que o próprio google-auth renova o token durante uma requisição (~4 min).
+TOKEN_REFRESH_MARGIN_SECONDS = 600
+# Intervalo (em segundos) entre as verificações da validade do token
+TOKEN_CHECK_INTERVAL_SECONDS = 60
+
+_refresh_lock = threading.Lock()
+
+
+def _seconds_to_expiry(creds):
+    if creds.expiry is None: # Token ainda não emitido
+        return 0
+    return (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() # expiry é UTC sem fuso
+
+def refresh_token_if_needed(creds, margin=TOKEN_REFRESH_MARGIN_SECONDS):
+    """Renova o token de acesso se faltar menos de `margin` segundos para expirar. Retorna True se renovou."""
+    with _refresh_lock:
+        if creds.token and _seconds_to_expiry(creds) > margin:
+            return False
+        creds.refresh(Request())
+        return True
+
+def _refresh_loop(creds):
+    while True:
+        time.sleep(TOKEN_CHECK_INTERVAL_SECONDS)
+        try:
+            if refresh_token_if_needed(creds):
+                logger.info("Token renovado; expira em %s UTC", f"{creds.expiry:%H:%M:%S}")
+        except Exception as e:
+            logger.warning("Falha ao renovar o token (nova tentativa em %ss): %s", TOKEN_CHECK_INTERVAL_SECONDS, e)
+
+@st.cache_resource
+def get_credentials():
+    """
+    Credenciais da conta de serviço (st.secrets), únicas no processo e compartilhadas pelo cliente
+    gspread e pelo serviço do Drive. O primeiro token é emitido aqui; depois, uma thread o renova
+    TOKEN_REFRESH_MARGIN_SECONDS antes de expirar, de modo que nenhuma requisição de usuário espera
+    pela emissão de um token. Retorna None se as credenciais não estiverem disponíveis.
+    """
+    if "gcp_service_account" not in st.secrets:
+        st.error("Credenciais da Conta de Serviço GCP (gcp_service_account) não encontradas nos Segredos do Streamlit.")
+        return None
+    try:
+        creds = Credentials.from_service_account_info(dict(st.secrets["gcp_service_account"]), scopes=SCOPES)
+    except Exception as e:
+        st.error(f"Erro ao carregar as credenciais da conta de serviço: {e}")
+        return None
+    try:
+        refresh_token_if_needed(creds)
+    except Exception as e: # Sem rede no momento: o google-auth tenta de novo na primeira requisição
+        logger.warning("Falha ao emitir o token inicial: %s", e)
+    threading.Thread(target=_refresh_loop, args=(creds,), name="credentials-refresh", daemon=True).start()
+    return creds
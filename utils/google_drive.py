@@ -0,0 +1,151 @@
+import io
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import httplib2
+import streamlit as st
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseUpload
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from utils.credentials import get_credentials
+from utils.google_sheets import update_cell_in_sheet
+
+logger = logging.getLogger(__name__)
+
+# Máximo de conexões httplib2 autorizadas abertas ao mesmo tempo com o Drive (ver drive_http)
+DRIVE_HTTP_POOL_SIZE = 8
+
+
+@st.cache_resource
+def get_drive_service():
+    """
+    Retorna o serviço do Google Drive (v3), autorizado com as credenciais compartilhadas de
+    utils.credentials, ou None. O objeto do serviço é compartilhado por todas as sessões, mas o
+    transporte httplib2 não é thread-safe: execute cada requisição com uma conexão emprestada
+    por drive_http(), ex.: `with drive_http() as http: request.execute(http=http)`.
+    """
+    creds = get_credentials()
+    if creds is None:
+        return None
+    try:
+        return build('drive', 'v3', credentials=creds)
+    except Exception as e:
+        st.error(f"Erro ao criar o serviço do Google Drive: {e}")
+        return None
+
+# Pool de conexões httplib2 autorizadas: cada uma mantém seu keep-alive com o Drive e é usada
+# por uma única thread de cada vez. Guarda as credenciais que a autorizaram, para descartar as
+# conexões antigas se as credenciais do processo forem recriadas.
+_http_pool = queue.LifoQueue()
+_http_slots = threading.BoundedSemaphore(DRIVE_HTTP_POOL_SIZE)
+
+@contextmanager
+def drive_http():
+    """
+    Empresta uma conexão httplib2 autorizada do pool (bloqueia se as DRIVE_HTTP_POOL_SIZE
+    estiverem em uso) e a devolve ao final do bloco.
+    """
+    creds = get_credentials()
+    if creds is None:
+        raise RuntimeError("Credenciais do Google Drive indisponíveis.")
+    with _http_slots:
+        entry = None
+        while entry is None:
+            try:
+                entry = _http_pool.get_nowait()
+            except queue.Empty:
+                entry = (creds, AuthorizedHttp(creds, http=httplib2.Http())) # Nova conexão (novo handshake TLS)
+            if entry[0] is not creds:
+                entry = None # Autorizada por credenciais antigas: descarta
+        try:
+            yield entry[1]
+        finally:
+            _http_pool.put(entry)
+
+@dataclass
+class UploadResult:
+    """Resultado de upload_document_and_link; avaliado como True quando todas as etapas deram certo."""
+    link: str = None
+    file_id: str = None
+    permission_ok: bool = False
+    sheet_ok: bool = False
+    error: str = None
+    timings: dict = field(default_factory=dict) # etapa -> segundos
+
+    def __bool__(self):
+        return self.link is not None and self.permission_ok and self.sheet_ok
+
+    def timings_text(self):
+        return ", ".join(f"{step}: {seconds:.2f}s" for step, seconds in self.timings.items())
+
+
+def _timed(timings, step, fn, *args, **kwargs):
+    """Executa fn registrando a duração em timings[step] (mesmo se fn falhar)."""
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[step] = time.perf_counter() - started
+
+def _in_script_context(ctx, fn):
+    """Permite que fn use st.* (ex.: st.error) a partir de uma thread do pool."""
+    def run(*args, **kwargs):
+        add_script_run_ctx(ctx=ctx)
+        return fn(*args, **kwargs)
+    return run
+
+def _grant_public_read(drive_service, file_id):
+    with drive_http() as http:
+        drive_service.permissions().create(fileId=file_id, body={'type': 'anyone', 'role': 'reader'}).execute(http=http)
+    return True
+
+def _create_file(drive_service, file_bytes, filename, mimetype, folder_id):
+    with drive_http() as http:
+        return drive_service.files().create(
+            body={'name': filename, 'parents': [folder_id]},
+            media_body=MediaIoBaseUpload(io.BytesIO(file_bytes), mimetype=mimetype, resumable=True),
+            fields='id, webViewLink',
+        ).execute(http=http)
+
+def upload_document_and_link(file_bytes, filename, mimetype, folder_id, spreadsheet_url, worksheet_name, row_key, col_name):
+    """
+    Envia o arquivo para a pasta do Drive e grava o link na célula (row_key, col_name) da aba.
+    Assim que o upload devolve o ID e o link do arquivo, a permissão de leitura pública e a escrita
+    do link na planilha são feitas em paralelo. Retorna um UploadResult com o tempo de cada etapa.
+    """
+    result = UploadResult()
+    started = time.perf_counter()
+    drive_service = get_drive_service()
+    if not drive_service:
+        result.error = "Serviço do Google Drive indisponível."
+        return result
+
+    try:
+        uploaded = _timed(result.timings, "upload", _create_file, drive_service, file_bytes, filename, mimetype, folder_id)
+    except Exception as e:
+        result.error = f"Erro ao fazer upload para o Google Drive: {e}"
+        return result
+    result.file_id, result.link = uploaded.get('id'), uploaded.get('webViewLink')
+
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="drive-upload") as pool:
+        permission = pool.submit(_in_script_context(ctx, _timed), result.timings, "permissao",
+                                 _grant_public_read, drive_service, result.file_id)
+        sheet = pool.submit(_in_script_context(ctx, _timed), result.timings, "planilha",
+                            update_cell_in_sheet, spreadsheet_url, worksheet_name, None, row_key, col_name, result.link)
+        try:
+            result.permission_ok = permission.result()
+        except Exception as e:
+            result.error = f"Erro ao liberar o acesso ao arquivo no Google Drive: {e}"
+        result.sheet_ok = bool(sheet.result())
+
+    result.timings["total"] = time.perf_counter() - started
+    logger.info("Upload de '%s': %s", filename, result.timings_text())
+    return result
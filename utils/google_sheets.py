@@ -1,37 +1,108 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+
 import streamlit as st
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
+import numpy as np
+from requests.adapters import HTTPAdapter
+
+from utils.credentials import get_credentials
+from utils.rate_limit import PRIORITY_BACKGROUND, install_rate_limiter, request_priority
+from utils.snapshot_store import load_snapshot, save_snapshot_in_background
+from utils.storage import CellUpdateResult, SQLiteBackend, StorageBackend, spreadsheet_key
+
+logger = logging.getLogger(__name__)
+
+# Idade máxima (em segundos) de um snapshot compartilhado antes de revalidá-lo
+SNAPSHOT_TTL_SECONDS = 300
+
+# Linhas por requisição nas leituras em blocos (iter_sheet_chunks / streaming=True)
+STREAMING_ROWS_PER_CHUNK = 5000
 
-# Escopo unificado para todas as operações do gspread neste módulo
-SCOPE = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+# Linhas por requisição em append_rows_to_sheet
+APPEND_ROWS_PER_CHUNK = 500
 
-@st.cache_resource(ttl=300) # Cacheia o cliente gspread por 5 minutos
+# Intervalo mínimo (em segundos) entre atualizações forçadas de um mesmo snapshot (botão "Atualizar")
+REFRESH_MIN_INTERVAL_SECONDS = 10
+
+# Conexões keep-alive mantidas pela sessão HTTP do gspread (compartilhada por todas as sessões do app).
+# O padrão do requests (10) descarta conexões quando há mais threads simultâneas que isso.
+HTTP_POOL_MAXSIZE = 32
+
+# Endpoint do Drive usado para consultar a revisão da planilha sem baixar os dados
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files/{}"
+
+@st.cache_resource
 def get_gspread_client():
     """
-    Autoriza e retorna um cliente gspread usando credenciais do st.secrets.
-    O cliente é cacheado para otimizar o desempenho.
+    Retorna o cliente gspread do processo, autorizado com as credenciais compartilhadas de
+    utils.credentials (cujo token é renovado em segundo plano, por isso o cliente não expira).
+    Todas as requisições feitas por ele (Sheets e Drive) passam pelo limitador de taxa do
+    processo (utils.rate_limit).
     """
-    if "gcp_service_account" in st.secrets:
-        creds_dict = st.secrets["gcp_service_account"]
-        try:
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
-            client = gspread.authorize(creds)
-            return client
-        except Exception as e:
-            st.error(f"Erro ao autorizar o cliente gspread com st.secrets: {e}")
-            return None # Retornar None em caso de falha na autorização
-    else:
-        st.error("Credenciais da Conta de Serviço GCP (gcp_service_account) não encontradas nos Segredos do Streamlit.")
-        return None # Retornar None
+    creds = get_credentials()
+    if creds is None:
+        return None
+    try:
+        client = gspread.authorize(creds)
+        session = getattr(client, "http_client", client).session # gspread >= 6 guarda a sessão em http_client
+        # requests.Session/urllib3 são seguros entre threads; basta um pool de conexões do tamanho da concorrência
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE))
+        install_rate_limiter(session)
+        return client
+    except Exception as e:
+        st.error(f"Erro ao autorizar o cliente gspread com st.secrets: {e}")
+        return None # Retornar None em caso de falha na autorização
+
+# Cache de objetos Spreadsheet/Worksheet já resolvidos, para não repetir as consultas de
+# metadados (open_by_url + worksheet) a cada leitura/escrita. Cada entrada guarda o cliente
+# que a criou: quando o cliente cacheado é renovado, os objetos antigos são descartados.
+_spreadsheet_handles = {}
+_worksheet_handles = {}
+_header_rows = {}
+_handles_lock = threading.Lock()
+
+def _cached_handle(cache, cache_key, client):
+    entry = cache.get(cache_key)
+    if entry is not None and entry[0] is client:
+        return entry[1]
+    return None
+
+def invalidate_worksheet_cache(url=None, worksheet_name=None):
+    """
+    Descarta os objetos Spreadsheet/Worksheet cacheados da planilha/aba indicada
+    (ou todos, se nada for informado). Use após renomear/excluir abas.
+    """
+    key = spreadsheet_key(url) if url else None
+    with _handles_lock:
+        if worksheet_name is None:
+            for cache_key in list(_spreadsheet_handles):
+                if key is None or cache_key == key:
+                    _spreadsheet_handles.pop(cache_key, None)
+        for cache in (_worksheet_handles, _header_rows):
+            for cache_key in list(cache):
+                if (key is None or cache_key[0] == key) and (worksheet_name is None or cache_key[1] == worksheet_name):
+                    cache.pop(cache_key, None)
 
 def get_google_sheet_by_url(url):
     """Conecta ao Google Sheets usando a URL e retorna a planilha (objeto Spreadsheet)"""
     client = get_gspread_client()
     if not client:
         return None # Cliente não autorizado
+    key = spreadsheet_key(url)
+    sheet = _cached_handle(_spreadsheet_handles, key, client)
+    if sheet is not None:
+        return sheet
     try:
-        sheet = client.open_by_url(url)
+        sheet = client.open_by_key(key)
+        with _handles_lock:
+            _spreadsheet_handles[key] = (client, sheet)
         return sheet
     except gspread.exceptions.SpreadsheetNotFound:
         st.error(f"Planilha não encontrada na URL fornecida: {url}")
@@ -42,10 +113,17 @@ def get_google_sheet_by_url(url):
 
 def get_worksheet(url, worksheet_name):
     """Obtém uma aba específica (objeto Worksheet) da planilha"""
+    client = get_gspread_client()
+    cache_key = (spreadsheet_key(url), worksheet_name)
+    worksheet = _cached_handle(_worksheet_handles, cache_key, client)
+    if worksheet is not None:
+        return worksheet
     sheet = get_google_sheet_by_url(url)
     if sheet:
         try:
             worksheet = sheet.worksheet(worksheet_name)
+            with _handles_lock:
+                _worksheet_handles[cache_key] = (client, worksheet)
             return worksheet
         except gspread.exceptions.WorksheetNotFound:
             st.warning(f"Aba '{worksheet_name}' não encontrada na planilha {url}.")
@@ -55,10 +133,89 @@ def get_worksheet(url, worksheet_name):
             return None
     return None
 
-def read_sheet_to_dataframe(spreadsheet_url, worksheet_name):
+def _gsheets_get_revision(url):
+    """
+    Consulta barata de metadados no Drive (files.get com fields=modifiedTime,version).
+    Retorna um identificador da revisão atual da planilha, ou None se a consulta falhar.
+    """
+    client = get_gspread_client()
+    if not client:
+        return None
+    http = getattr(client, "http_client", client) # gspread >= 6 expõe o transporte em client.http_client
+    try:
+        response = http.request("get", DRIVE_FILES_URL.format(spreadsheet_key(url)),
+                                params={"fields": "modifiedTime,version", "supportsAllDrives": True})
+        metadata = response.json()
+    except Exception:
+        return None
+    if not metadata.get("version") and not metadata.get("modifiedTime"):
+        return None
+    return f"{metadata.get('version')}@{metadata.get('modifiedTime')}"
+
+def _gsheets_get_headers(url, worksheet_name):
+    """
+    Retorna a linha de cabeçalhos da aba (lista de nomes), lida uma vez e reaproveitada
+    por até SNAPSHOT_TTL_SECONDS (ou até a revisão da planilha mudar).
+    Retorna None se a aba não puder ser lida.
+    """
+    cache_key = (spreadsheet_key(url), worksheet_name)
+    entry = _header_rows.get(cache_key)
+    if entry is not None and time.monotonic() - entry[1] < SNAPSHOT_TTL_SECONDS:
+        return entry[0]
+    worksheet = get_worksheet(url, worksheet_name)
+    if not worksheet:
+        return None
+    try:
+        headers = worksheet.row_values(1)
+    except Exception as e:
+        st.error(f"Erro ao ler os cabeçalhos da aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return None
+    with _handles_lock:
+        _header_rows[cache_key] = (headers, time.monotonic())
+    return headers
+
+def _forget_headers(url, worksheet_name):
+    """Descarta os cabeçalhos cacheados da aba (a revisão da planilha mudou: colunas podem ter sido inseridas)."""
+    with _handles_lock:
+        _header_rows.pop((spreadsheet_key(url), worksheet_name), None)
+
+def _a1_range(worksheet_title, a1_notation):
+    """Monta um intervalo absoluto ('Aba'!A1) escapando aspas no nome da aba."""
+    return "'{}'!{}".format(worksheet_title.replace("'", "''"), a1_notation)
+
+def _cell_value(value):
+    """Converte o valor para texto antes de enviar ao gspread (None vira célula vazia)."""
+    return str(value) if value is not None else ""
+
+def _rows_to_dataframe(rows, headers):
+    """
+    Monta o DataFrame a partir das linhas da planilha sem laço Python por linha:
+    linhas curtas são completadas com None e linhas longas são truncadas no número de cabeçalhos.
+    """
+    num_headers = len(headers)
+    values = pd.DataFrame(rows, dtype=object).to_numpy()
+    if values.shape[1] > num_headers:
+        values = values[:, :num_headers]
+    elif values.shape[1] < num_headers:
+        padding = np.full((values.shape[0], num_headers - values.shape[1]), None, dtype=object)
+        values = np.hstack([values, padding])
+    return pd.DataFrame(values, columns=headers)
+
+def _apply_dtypes(df, dtypes=None, default_dtype=None):
     """
-    Lê uma aba específica de uma planilha do Google Sheets e a retorna como um DataFrame pandas.
+    Converte as colunas do DataFrame: dtypes mapeia nome da coluna -> dtype (ex.: 'category')
+    e default_dtype (ex.: 'string') vale para as demais. Colunas ausentes em df são ignoradas.
     """
+    if not dtypes and default_dtype is None:
+        return df
+    dtypes = dtypes or {}
+    conversions = {col: dtypes.get(col, default_dtype) for col in df.columns.unique()}
+    conversions = {col: dtype for col, dtype in conversions.items() if dtype is not None}
+    return df.astype(conversions) if conversions else df
+
+def _gsheets_read_dataframe(spreadsheet_url, worksheet_name):
+    """Lê a aba inteira com get_all_values e a retorna como DataFrame (sem tipagem)."""
     worksheet = get_worksheet(spreadsheet_url, worksheet_name)
     if not worksheet:
         return None # Falha no carregamento, mensagem já dada
@@ -75,61 +232,363 @@ def read_sheet_to_dataframe(spreadsheet_url, worksheet_name):
              st.warning(f"A aba '{worksheet_name}' em {spreadsheet_url} não contém cabeçalhos.")
              return pd.DataFrame()
 
-        processed_rows = []
-        num_headers = len(headers)
-        for row in rows:
-            # Ensure each row has the same number of elements as headers, padding with None if necessary
-            row_len = len(row)
-            if row_len < num_headers:
-                processed_rows.append(row + [None] * (num_headers - row_len))
-            elif row_len > num_headers:
-                processed_rows.append(row[:num_headers]) # Truncate if row is too long
-            else:
-                processed_rows.append(row)
-        
-        return pd.DataFrame(processed_rows, columns=headers)
+        return _rows_to_dataframe(rows, headers)
     except Exception as e:
         st.error(f"Erro ao converter a aba '{worksheet_name}' para DataFrame: {e}")
+        invalidate_worksheet_cache(spreadsheet_url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
         return None
 
+def _column_letter(col_index):
+    """Converte o índice 1-based da coluna na letra A1 correspondente (1 -> A, 27 -> AA)."""
+    return gspread.utils.rowcol_to_a1(1, col_index)[:-1]
 
-def write_dataframe_to_sheet(url, worksheet_name, dataframe):
-    """Escreve um DataFrame em uma aba específica, substituindo o conteúdo existente."""
-    worksheet = get_worksheet(url, worksheet_name)
-    if worksheet:
-        try:
-            worksheet.clear() 
-            
-            headers = dataframe.columns.tolist()
-            # worksheet.update([headers] + dataframe.values.tolist()) # gspread v5+
-            # For older gspread or to be safe:
-            worksheet.update_cells(gspread.utils.fill_gaps(worksheet.range(1,1,len(dataframe.index)+1,len(headers))),[headers] + dataframe.values.tolist())
+def _column_spans(headers, columns):
+    """Posições (1-based) das colunas pedidas, agrupadas em faixas contíguas: [2, 3, 4, 7] -> [(2, 4), (7, 7)]."""
+    positions = sorted({headers.index(col) + 1 for col in columns if col in headers})
+    spans = []
+    for position in positions:
+        if spans and position == spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], position)
+        else:
+            spans.append((position, position))
+    return spans
 
-            return True
-        except Exception as e:
-            st.error(f"Erro ao escrever DataFrame na aba '{worksheet_name}': {e}")
-            return False
-    return False
+def _span_ranges(worksheet_title, spans):
+    return [_a1_range(worksheet_title, f"{_column_letter(first)}2:{_column_letter(last)}") for first, last in spans]
 
-def append_row_to_sheet(url, worksheet_name, row_data_list):
-    """Adiciona uma nova linha (lista de valores) ao final de uma aba."""
+def _spans_to_dataframe(headers, columns, spans, value_ranges):
+    """Monta o DataFrame das colunas pedidas a partir das faixas lidas com majorDimension=COLUMNS."""
+    values_by_position = {}
+    for (first, last), value_range in zip(spans, value_ranges):
+        span_values = value_range.get("values", [])
+        for offset, position in enumerate(range(first, last + 1)):
+            values_by_position[position] = span_values[offset] if offset < len(span_values) else []
+
+    num_rows = max((len(values) for values in values_by_position.values()), default=0)
+    data = {}
+    for col in columns:
+        if col in headers and col not in data:
+            values = values_by_position[headers.index(col) + 1]
+            data[col] = values + [""] * (num_rows - len(values)) # Mesmo preenchimento de get_all_values
+    return pd.DataFrame(data)
+
+def _gsheets_read_columns(spreadsheet_url, worksheet_name, columns):
+    """
+    Mapeia os cabeçalhos para intervalos A1 (colunas vizinhas são agrupadas em um mesmo
+    intervalo) e busca todos em uma única requisição values.batchGet.
+    """
+    headers = _gsheets_get_headers(spreadsheet_url, worksheet_name)
+    if headers is None:
+        return None
+    spans = _column_spans(headers, columns)
+    if not spans:
+        return pd.DataFrame(columns=[col for col in columns if col in headers])
+
+    worksheet = get_worksheet(spreadsheet_url, worksheet_name)
+    if not worksheet:
+        return None
+    try:
+        response = worksheet.spreadsheet.values_batch_get(_span_ranges(worksheet.title, spans), params={"majorDimension": "COLUMNS"})
+        return _spans_to_dataframe(headers, columns, spans, response.get("valueRanges", []))
+    except Exception as e:
+        st.error(f"Erro ao ler colunas da aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(spreadsheet_url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return None
+
+def _columns_to_grid(columns_values):
+    """Converte a resposta com majorDimension=COLUMNS em uma matriz de linhas retangular (preenchida com '')."""
+    num_rows = max((len(values) for values in columns_values), default=0)
+    return [list(row) for row in zip(*[values + [""] * (num_rows - len(values)) for values in columns_values])]
+
+def _gsheets_read_batch(url, requests):
+    """
+    Lê várias abas em uma única requisição values.batchGet (ver read_sheets_batch).
+    Pedidos por nome de coluna usam os cabeçalhos em cache; sem eles, a aba inteira entra no
+    lote e as colunas são selecionadas localmente, para não gastar outra requisição.
+    """
+    results = {worksheet_name: None for worksheet_name in requests}
+    spreadsheet = get_google_sheet_by_url(url)
+    if not spreadsheet:
+        return results
+
+    plan = [] # (aba, pedido, cabeçalhos, faixas, quantidade de intervalos no lote)
+    ranges = []
+    for worksheet_name, request in requests.items():
+        cached = _header_rows.get((spreadsheet_key(url), worksheet_name))
+        headers = cached[0] if cached is not None and time.monotonic() - cached[1] < SNAPSHOT_TTL_SECONDS else None
+        if isinstance(request, (list, tuple)) and headers is not None:
+            spans = _column_spans(headers, request)
+            ranges.extend(_span_ranges(worksheet_name, spans))
+            plan.append((worksheet_name, request, headers, spans, len(spans)))
+        else:
+            whole_sheet = "'{}'".format(worksheet_name.replace("'", "''"))
+            ranges.append(_a1_range(worksheet_name, request) if isinstance(request, str) else whole_sheet)
+            plan.append((worksheet_name, request, None, None, 1))
+
+    try:
+        value_ranges = spreadsheet.values_batch_get(ranges, params={"majorDimension": "COLUMNS"}).get("valueRanges", []) if ranges else []
+    except Exception as e:
+        st.error(f"Erro ao ler as abas {', '.join(requests)} em lote: {e}")
+        return results
+
+    offset = 0
+    for worksheet_name, request, headers, spans, count in plan:
+        response_ranges = value_ranges[offset:offset + count]
+        offset += count
+        if spans is not None:
+            results[worksheet_name] = _spans_to_dataframe(headers, request, spans, response_ranges)
+            continue
+        grid = _columns_to_grid(response_ranges[0].get("values", []) if response_ranges else [])
+        if not grid or not grid[0]:
+            results[worksheet_name] = pd.DataFrame()
+            continue
+        df = _rows_to_dataframe(grid[1:], grid[0])
+        if request is None:
+            with _handles_lock:
+                _header_rows[(spreadsheet_key(url), worksheet_name)] = (grid[0], time.monotonic())
+        if isinstance(request, (list, tuple)):
+            df = df.loc[:, ~df.columns.duplicated()][[col for col in dict.fromkeys(request) if col in df.columns]]
+        results[worksheet_name] = df
+    return results
+
+def _gsheets_read_row(spreadsheet_url, worksheet_name, row_index_df):
+    """Usa os cabeçalhos cacheados e busca apenas o intervalo A1 da linha (ver read_sheet_row)."""
+    headers = _gsheets_get_headers(spreadsheet_url, worksheet_name)
+    if headers is None:
+        return None
+    if not headers:
+        st.warning(f"A aba '{worksheet_name}' em {spreadsheet_url} não contém cabeçalhos.")
+        return pd.Series(dtype=object)
+    worksheet = get_worksheet(spreadsheet_url, worksheet_name)
+    if not worksheet:
+        return None
+    try:
+        gspread_row_index = int(row_index_df) + 2
+        a1_notation = f"A{gspread_row_index}:{_column_letter(len(headers))}{gspread_row_index}"
+        values = worksheet.spreadsheet.values_get(_a1_range(worksheet.title, a1_notation)).get("values", [])
+        if not values:
+            return pd.Series(dtype=object)
+        row = values[0]
+        return pd.Series(row + [""] * (len(headers) - len(row)), index=headers, name=int(row_index_df))
+    except ValueError:
+        st.error(f"Índice da linha inválido: {row_index_df}")
+        return None
+    except Exception as e:
+        st.error(f"Erro ao ler a linha {row_index_df} da aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(spreadsheet_url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return None
+
+def _gsheets_read_row_fresh(spreadsheet_url, worksheet_name, row_index_df):
+    """
+    Lê a linha de cabeçalhos e a linha pedida em uma única requisição values.batchGet;
+    os cabeçalhos lidos substituem os cacheados (ver _checked_row).
+    """
+    worksheet = get_worksheet(spreadsheet_url, worksheet_name)
+    if not worksheet:
+        return None
+    try:
+        gspread_row_index = int(row_index_df) + 2
+        ranges = [_a1_range(worksheet.title, "1:1"), _a1_range(worksheet.title, f"{gspread_row_index}:{gspread_row_index}")]
+        value_ranges = worksheet.spreadsheet.values_batch_get(ranges).get("valueRanges", [])
+        header_values = value_ranges[0].get("values", []) if value_ranges else []
+        headers = header_values[0] if header_values else []
+        with _handles_lock:
+            _header_rows[(spreadsheet_key(spreadsheet_url), worksheet_name)] = (headers, time.monotonic())
+        row_values = value_ranges[1].get("values", []) if len(value_ranges) > 1 else []
+        if not headers or not row_values:
+            return pd.Series(dtype=object)
+        row = row_values[0][:len(headers)]
+        return pd.Series(row + [""] * (len(headers) - len(row)), index=headers, name=int(row_index_df))
+    except ValueError:
+        st.error(f"Índice da linha inválido: {row_index_df}")
+        return None
+    except Exception as e:
+        st.error(f"Erro ao ler a linha {row_index_df} da aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(spreadsheet_url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return None
+
+def _gsheets_grid_size(worksheet):
+    """(linhas, colunas) atuais da grade da aba (os valores guardados no objeto Worksheet podem estar desatualizados)."""
+    metadata = worksheet.spreadsheet.fetch_sheet_metadata(
+        {"fields": "sheets.properties(sheetId,gridProperties.rowCount,gridProperties.columnCount)"})
+    for sheet in metadata.get("sheets", []):
+        if sheet["properties"]["sheetId"] == worksheet.id:
+            grid = sheet["properties"]["gridProperties"]
+            return grid["rowCount"], grid.get("columnCount", worksheet.col_count)
+    return worksheet.row_count, worksheet.col_count
+
+def _gsheets_row_count(worksheet):
+    """Número atual de linhas da grade da aba."""
+    return _gsheets_grid_size(worksheet)[0]
+
+def _gsheets_iter_chunks(spreadsheet_url, worksheet_name, rows_per_chunk):
+    """
+    Pagina a aba em faixas A1 de rows_per_chunk linhas (uma requisição values.get por faixa).
+    Linhas em branco só são emitidas quando aparece uma linha com dados depois delas, de modo
+    que as posições e o final da aba coincidem com get_all_values.
+    """
+    headers = _gsheets_get_headers(spreadsheet_url, worksheet_name)
+    if headers is None:
+        yield None
+        return
+    if not headers:
+        st.warning(f"A aba '{worksheet_name}' em {spreadsheet_url} não contém cabeçalhos.")
+        return
+    worksheet = get_worksheet(spreadsheet_url, worksheet_name)
+    if not worksheet:
+        yield None
+        return
+
+    last_col = _column_letter(len(headers))
+    try:
+        row_count = _gsheets_row_count(worksheet)
+        first = 0 # Índice 0-based (linha 2 da planilha = 0) da próxima faixa
+        pending_blank = 0 # Linhas em branco lidas e ainda não emitidas
+        while first + 2 <= row_count:
+            start, end = first + 2, min(first + 1 + rows_per_chunk, row_count)
+            rows = worksheet.spreadsheet.values_get(_a1_range(worksheet.title, f"A{start}:{last_col}{end}")).get("values", [])
+            returned = len(rows) # A API omite as linhas em branco do fim da faixa
+            if rows:
+                rows = gspread.utils.fill_gaps([[]] * pending_blank + rows, cols=len(headers))
+                chunk = _rows_to_dataframe(rows, headers)
+                chunk.index = range(first - pending_blank, first + returned)
+                pending_blank = 0
+                yield chunk
+            pending_blank += (end - start + 1) - returned
+            first = end - 1
+    except Exception as e:
+        st.error(f"Erro ao ler a aba '{worksheet_name}' em blocos: {e}")
+        invalidate_worksheet_cache(spreadsheet_url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        yield None
+
+def _gsheets_read_cell(url, worksheet_name, row_index_df, col_name_df):
+    """Busca apenas a célula com values.get (usado pela escrita com expected_value)."""
+    headers = _gsheets_get_headers(url, worksheet_name)
+    if headers is None:
+        return None
+    if col_name_df not in headers:
+        st.error(f"Coluna '{col_name_df}' não encontrada nos cabeçalhos: {headers}")
+        return None
     worksheet = get_worksheet(url, worksheet_name)
-    if worksheet:
-        try:
-            worksheet.append_row(row_data_list)
-            return True
-        except Exception as e:
-            st.error(f"Erro ao adicionar linha na aba '{worksheet_name}': {e}")
-            return False
-    return False
+    if not worksheet:
+        return None
+    try:
+        a1_notation = gspread.utils.rowcol_to_a1(int(row_index_df) + 2, headers.index(col_name_df) + 1)
+        values = worksheet.spreadsheet.values_get(_a1_range(worksheet.title, a1_notation)).get("values", [])
+        return values[0][0] if values and values[0] else ""
+    except ValueError:
+        st.error(f"Índice da linha inválido: {row_index_df}")
+        return None
+    except Exception as e:
+        st.error(f"Erro ao ler a célula '{col_name_df}' da linha {row_index_df} na aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return None
+
+def _text_grid(dataframe):
+    """Cabeçalhos + linhas do DataFrame como matriz numpy de textos, como ficariam na planilha."""
+    values = dataframe.astype(object)
+    values = values.where(values.notna(), "").to_numpy()
+    to_text = np.frompyfunc(_cell_value, 1, 1)
+    header = np.array([[_cell_value(col) for col in dataframe.columns]], dtype=object)
+    return np.vstack([header, to_text(values) if values.size else values.reshape(0, header.shape[1])])
+
+def _pad_grid(grid, num_rows, num_cols):
+    padded = np.full((num_rows, num_cols), "", dtype=object)
+    padded[:grid.shape[0], :grid.shape[1]] = grid
+    return padded
 
-def update_cell_in_sheet(url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value):
+def _grid_diff_ranges(worksheet_title, current, target):
     """
-    Atualiza uma célula específica na planilha.
-    row_index_df é o índice 0-based do DataFrame.
-    col_name_df é o nome da coluna no DataFrame.
-    df_reference_for_headers é um DataFrame que possui os cabeçalhos corretos para encontrar o índice da coluna.
+    Intervalos A1 (com os valores de destino) das células em que target difere de current.
+    Células além do fim de target são apagadas; células vizinhas da mesma linha viram um só intervalo.
     """
+    num_rows = max(current.shape[0], target.shape[0])
+    num_cols = max(current.shape[1], target.shape[1])
+    target = _pad_grid(target, num_rows, num_cols)
+    changed = _pad_grid(current, num_rows, num_cols) != target
+
+    data = []
+    for row in np.flatnonzero(changed.any(axis=1)):
+        cols = np.flatnonzero(changed[row])
+        # Agrupa colunas contíguas: [0, 1, 2, 5] -> [(0, 2), (5, 5)]
+        breaks = np.flatnonzero(np.diff(cols) > 1)
+        for first, last in zip(np.r_[cols[0], cols[breaks + 1]], np.r_[cols[breaks], cols[-1]]):
+            a1_notation = (f"{gspread.utils.rowcol_to_a1(row + 1, first + 1)}:"
+                           f"{gspread.utils.rowcol_to_a1(row + 1, last + 1)}")
+            data.append({"range": _a1_range(worksheet_title, a1_notation), "values": [target[row, first:last + 1].tolist()]})
+    return data
+
+@dataclass
+class SheetGrid:
+    """Conteúdo da aba (grade inteira como textos) e tamanho da grade, na revisão em que foram conhecidos."""
+    values: np.ndarray
+    size: tuple = None # (linhas, colunas) da grade; None se ainda não foi consultado
+    revision: str = None
+
+_sheet_grids = {} # (chave_planilha, aba) -> SheetGrid da última escrita com write_dataframe_to_sheet
+
+def _gsheets_write_dataframe(url, worksheet_name, dataframe):
+    """
+    Compara o DataFrame com o conteúdo atual da aba (a grade inteira, inclusive colunas além dos
+    cabeçalhos) e envia só as células alteradas, as linhas novas e as linhas/colunas a apagar em uma
+    única requisição values.batchUpdate. A aba nunca fica vazia durante a escrita.
+    O conteúdo conhecido da aba fica em cache com a revisão da planilha: se ela não mudou desde a
+    última escrita, a aba não é relida e a escrita custa só a consulta da revisão e o batchUpdate.
+    """
+    worksheet = get_worksheet(url, worksheet_name)
+    if not worksheet:
+        return False
+    grid_key = (spreadsheet_key(url), worksheet_name)
+    try:
+        # A revisão é lida antes dos dados (como em get_sheet_snapshot)
+        revision = get_sheet_revision(url)
+        grid = _sheet_grids.get(grid_key)
+        if grid is None or revision is None or revision != grid.revision:
+            rows = worksheet.get_all_values()
+            current = pd.DataFrame(rows, dtype=object).fillna("").to_numpy() if rows else np.empty((0, 0), dtype=object)
+            grid = SheetGrid(values=current, revision=revision)
+        target = _text_grid(dataframe)
+        data = _grid_diff_ranges(worksheet.title, grid.values, target)
+        if not data:
+            _sheet_grids[grid_key] = grid
+            return True
+        # A grade da aba precisa comportar o novo conteúdo (tamanho atual lido da API, não do objeto cacheado)
+        grid_rows, grid_cols = grid.size or _gsheets_grid_size(worksheet)
+        if target.shape[0] > grid_rows:
+            worksheet.add_rows(target.shape[0] - grid_rows)
+        if target.shape[1] > grid_cols:
+            worksheet.add_cols(target.shape[1] - grid_cols)
+        _sheet_grids.pop(grid_key, None) # Até a escrita terminar, o conteúdo da aba não é conhecido
+        worksheet.spreadsheet.values_batch_update({"valueInputOption": "RAW", "data": data})
+        # A revisão nova só pode ser lida depois da escrita: uma alteração de outra pessoa entre o
+        # batchUpdate e esta consulta não seria percebida na próxima escrita (janela de uma requisição).
+        # Sem _singleflight: uma consulta iniciada antes da escrita devolveria a revisão antiga.
+        _sheet_grids[grid_key] = SheetGrid(values=target, size=(max(grid_rows, target.shape[0]), max(grid_cols, target.shape[1])),
+                                           revision=_gsheets_get_revision(url))
+        return True
+    except Exception as e:
+        _sheet_grids.pop(grid_key, None)
+        st.error(f"Erro ao escrever DataFrame na aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return False
+
+def _gsheets_append_rows(url, worksheet_name, rows):
+    """Adiciona as linhas com worksheet.append_rows (uma requisição) e lê na resposta onde elas foram gravadas."""
+    worksheet = get_worksheet(url, worksheet_name)
+    if not worksheet:
+        return None
+    try:
+        response = worksheet.append_rows(rows)
+        updated_range = response["updates"]["updatedRange"].rsplit("!", 1)[-1]
+        first_row = gspread.utils.a1_range_to_grid_range(updated_range)["startRowIndex"] + 1
+        return list(range(first_row, first_row + len(rows)))
+    except Exception as e:
+        st.error(f"Erro ao adicionar linhas na aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+        return None
+
+def _gsheets_update_cell(url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value):
+    """Atualiza a célula com worksheet.update_cell (ver update_cell_in_sheet)."""
     worksheet = get_worksheet(url, worksheet_name)
     if not worksheet:
         st.error(f"Não foi possível obter a aba '{worksheet_name}' para atualização.")
@@ -140,21 +599,893 @@ def update_cell_in_sheet(url, worksheet_name, df_reference_for_headers, row_inde
         gspread_row_index = int(row_index_df) + 2 
         
         # Encontra o índice da coluna no gspread (1-based)
-        if df_reference_for_headers is None or df_reference_for_headers.columns is None:
+        if df_reference_for_headers is None:
+            headers = _gsheets_get_headers(url, worksheet_name)
+            if headers is None:
+                return False
+        elif df_reference_for_headers.columns is None:
             st.error("DataFrame de referência para cabeçalhos é inválido.")
             return False
-            
-        headers = df_reference_for_headers.columns.tolist()
+        else:
+            headers = df_reference_for_headers.columns.tolist()
         if col_name_df not in headers:
             st.error(f"Coluna '{col_name_df}' não encontrada nos cabeçalhos: {headers}")
             return False
         gspread_col_index = headers.index(col_name_df) + 1
 
-        worksheet.update_cell(gspread_row_index, gspread_col_index, str(new_value) if new_value is not None else "") # Convert to string to avoid gspread issues with types
+        worksheet.update_cell(gspread_row_index, gspread_col_index, _cell_value(new_value)) # Convert to string to avoid gspread issues with types
         return True
     except ValueError: 
         st.error(f"Índice da linha inválido: {row_index_df}")
         return False
     except Exception as e:
         st.error(f"Erro ao atualizar célula (linha_gspread:{gspread_row_index}, col_gspread:{gspread_col_index}) na aba '{worksheet_name}': {e}")
+        invalidate_worksheet_cache(url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
         return False
+
+def _gsheets_update_cells(url, worksheet_name, updates, value_input_option="USER_ENTERED"):
+    """
+    Envia todas as células em uma única requisição values.batchUpdate, resolvendo os
+    cabeçalhos uma única vez para o lote (ver update_cells_batch).
+    """
+    updates = list(updates)
+    results = [CellUpdateResult(row_key, col_name) for row_key, col_name, _ in updates]
+    if not updates:
+        return results
+
+    worksheet = get_worksheet(url, worksheet_name)
+    headers = _gsheets_get_headers(url, worksheet_name) if worksheet else None
+    if not worksheet or headers is None:
+        for result in results:
+            result.error = f"Não foi possível obter a aba '{worksheet_name}' para atualização."
+        return results
+
+    data = []
+    pending = []
+    for result, (row_key, col_name, new_value) in zip(results, updates):
+        if col_name not in headers:
+            result.error = f"Coluna '{col_name}' não encontrada nos cabeçalhos."
+            continue
+        try:
+            gspread_row_index = int(row_key) + 2
+        except (TypeError, ValueError):
+            result.error = f"Índice da linha inválido: {row_key}"
+            continue
+        a1_notation = gspread.utils.rowcol_to_a1(gspread_row_index, headers.index(col_name) + 1)
+        data.append({"range": _a1_range(worksheet.title, a1_notation), "values": [[_cell_value(new_value)]]})
+        pending.append(result)
+
+    if not data:
+        return results
+    try:
+        worksheet.spreadsheet.values_batch_update({"valueInputOption": value_input_option, "data": data})
+        for result in pending:
+            result.ok = True
+    except Exception as e:
+        for result in pending:
+            result.error = f"Erro na atualização em lote da aba '{worksheet_name}': {e}"
+        invalidate_worksheet_cache(url, worksheet_name) # O objeto Worksheet cacheado pode estar obsoleto
+    return results
+
+
+class GoogleSheetsBackend(StorageBackend):
+    """Backend padrão: Google Sheets via gspread (funções _gsheets_* deste módulo)."""
+    name = "gsheets"
+
+    def get_revision(self, url):
+        return _gsheets_get_revision(url)
+
+    def get_headers(self, url, worksheet_name):
+        return _gsheets_get_headers(url, worksheet_name)
+
+    def read_dataframe(self, url, worksheet_name):
+        return _gsheets_read_dataframe(url, worksheet_name)
+
+    def read_columns(self, url, worksheet_name, columns):
+        return _gsheets_read_columns(url, worksheet_name, columns)
+
+    def read_row(self, url, worksheet_name, row_index_df):
+        return _gsheets_read_row(url, worksheet_name, row_index_df)
+
+    def read_row_fresh(self, url, worksheet_name, row_index_df):
+        return _gsheets_read_row_fresh(url, worksheet_name, row_index_df)
+
+    def read_cell(self, url, worksheet_name, row_index_df, col_name_df):
+        return _gsheets_read_cell(url, worksheet_name, row_index_df, col_name_df)
+
+    def iter_chunks(self, url, worksheet_name, rows_per_chunk):
+        return _gsheets_iter_chunks(url, worksheet_name, rows_per_chunk)
+
+    def read_batch(self, url, requests):
+        return _gsheets_read_batch(url, requests)
+
+    def write_dataframe(self, url, worksheet_name, dataframe):
+        return _gsheets_write_dataframe(url, worksheet_name, dataframe)
+
+    def append_rows(self, url, worksheet_name, rows):
+        return _gsheets_append_rows(url, worksheet_name, rows)
+
+    def update_cell(self, url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value):
+        return _gsheets_update_cell(url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value)
+
+    def update_cells(self, url, worksheet_name, updates, value_input_option="USER_ENTERED"):
+        return _gsheets_update_cells(url, worksheet_name, updates, value_input_option)
+
+def _config_value(name, default=None):
+    """Lê uma configuração da variável de ambiente `name` ou, se ausente, de st.secrets[name.lower()]."""
+    if os.environ.get(name):
+        return os.environ[name]
+    try:
+        return st.secrets.get(name.lower(), default)
+    except Exception: # Sem secrets.toml configurado
+        return default
+
+@st.cache_resource
+def get_storage_backend():
+    """
+    Retorna o backend de armazenamento configurado em STORAGE_BACKEND (variável de ambiente
+    ou storage_backend no st.secrets): 'gsheets' (padrão) ou 'sqlite'. O arquivo do SQLite
+    é definido por SQLITE_STORAGE_PATH.
+    """
+    backend_name = str(_config_value("STORAGE_BACKEND", GoogleSheetsBackend.name)).strip().lower()
+    if backend_name == SQLiteBackend.name:
+        return SQLiteBackend(_config_value("SQLITE_STORAGE_PATH", SQLiteBackend.DEFAULT_PATH))
+    return GoogleSheetsBackend()
+
+
+# --- Singleflight: leituras idênticas e simultâneas compartilham uma única requisição ---
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def _singleflight(flight_key, fetch):
+    """
+    Executa fetch() uma única vez por flight_key enquanto houver uma chamada em andamento:
+    as demais threads com a mesma chave aguardam e recebem o mesmo resultado (ou exceção).
+    Quem aguardou recebe uma cópia de DataFrames/Series/listas, para não compartilhar objetos mutáveis.
+    """
+    with _flights_lock:
+        flight = _flights.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _flights[flight_key] = _Flight()
+    if leader:
+        try:
+            flight.result = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with _flights_lock:
+                _flights.pop(flight_key, None)
+            flight.done.set()
+        return flight.result
+
+    flight.done.wait()
+    if flight.error is not None:
+        raise flight.error
+    result = flight.result
+    return result.copy() if isinstance(result, (pd.DataFrame, pd.Series, list)) else result
+
+
+# --- API pública: as páginas usam estas funções, que delegam ao backend configurado ---
+def get_sheet_revision(url):
+    """
+    Identificador barato da revisão atual da planilha (no Google Sheets, files.get do Drive com
+    fields=modifiedTime,version). Retorna None se a consulta falhar.
+    """
+    return _singleflight((spreadsheet_key(url), None, "revision"),
+                         lambda: get_storage_backend().get_revision(url))
+
+def get_sheet_headers(url, worksheet_name):
+    """Retorna a linha de cabeçalhos da aba (lista de nomes), ou None se a aba não puder ser lida."""
+    return _singleflight((spreadsheet_key(url), worksheet_name, "headers"),
+                         lambda: get_storage_backend().get_headers(url, worksheet_name))
+
+def iter_sheet_chunks(spreadsheet_url, worksheet_name, rows_per_chunk=STREAMING_ROWS_PER_CHUNK):
+    """
+    Lê a aba em blocos de rows_per_chunk linhas, gerando um DataFrame por bloco (o índice é a
+    posição 0-based da linha, como em read_sheet_to_dataframe). No Google Sheets cada bloco é uma
+    requisição values.get de uma faixa A1, então a aba nunca fica inteira na memória como lista de listas.
+    Um item None indica erro (mensagem já exibida) e encerra a iteração.
+    """
+    return get_storage_backend().iter_chunks(spreadsheet_url, worksheet_name, rows_per_chunk)
+
+def _read_sheet_streaming(spreadsheet_url, worksheet_name, rows_per_chunk, dtypes, default_dtype):
+    """Concatena os blocos de iter_sheet_chunks, tipando cada um antes de ler o próximo."""
+    chunks = []
+    for chunk in iter_sheet_chunks(spreadsheet_url, worksheet_name, rows_per_chunk):
+        if chunk is None:
+            return None
+        chunks.append(_apply_dtypes(chunk, dtypes, default_dtype))
+    if not chunks:
+        return pd.DataFrame(columns=get_sheet_headers(spreadsheet_url, worksheet_name) or [])
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+    return _apply_dtypes(df, dtypes, default_dtype) # Categorias diferentes entre blocos viram object no concat
+
+def read_sheet_to_dataframe(spreadsheet_url, worksheet_name, dtypes=None, default_dtype=None,
+                            streaming=False, rows_per_chunk=STREAMING_ROWS_PER_CHUNK):
+    """
+    Lê uma aba específica da planilha e a retorna como um DataFrame pandas.
+    Chamadas simultâneas para a mesma aba compartilham uma única leitura (ver _singleflight).
+    dtypes/default_dtype permitem tipar as colunas na carga (ex.: {'Setor': 'category'}, 'string').
+    Com streaming=True, a aba é lida em blocos (iter_sheet_chunks) já tipados, o que limita o pico
+    de memória em abas muito grandes ao custo de uma requisição por bloco.
+    """
+    if streaming:
+        flight_key = (spreadsheet_key(spreadsheet_url), worksheet_name,
+                      ("stream", rows_per_chunk, tuple(sorted(dtypes.items())) if dtypes else None, default_dtype))
+        return _singleflight(flight_key, lambda: _read_sheet_streaming(spreadsheet_url, worksheet_name, rows_per_chunk,
+                                                                      dtypes, default_dtype))
+    df = _singleflight((spreadsheet_key(spreadsheet_url), worksheet_name, "all"),
+                       lambda: get_storage_backend().read_dataframe(spreadsheet_url, worksheet_name))
+    return _apply_dtypes(df, dtypes, default_dtype) if df is not None else None
+
+def read_sheet_columns(spreadsheet_url, worksheet_name, columns, dtypes=None, default_dtype=None):
+    """
+    Lê apenas as colunas indicadas (pelo nome do cabeçalho) e as retorna como DataFrame.
+    No Google Sheets, todas as colunas vêm de uma única requisição values.batchGet.
+    Colunas inexistentes são ignoradas; dtypes/default_dtype funcionam como em read_sheet_to_dataframe.
+    """
+    df = _singleflight((spreadsheet_key(spreadsheet_url), worksheet_name, ("columns", tuple(columns))),
+                       lambda: get_storage_backend().read_columns(spreadsheet_url, worksheet_name, columns))
+    return _apply_dtypes(df, dtypes, default_dtype) if df is not None else None
+
+def read_sheets_batch(spreadsheet_url, requests, dtypes=None):
+    """
+    Lê várias abas da mesma planilha de uma só vez (no Google Sheets, uma única requisição
+    values.batchGet, sem abrir cada aba). requests mapeia o nome da aba para None (aba inteira),
+    uma lista de nomes de colunas ou um intervalo A1 cuja primeira linha traz os cabeçalhos (ex.: 'A1:E').
+    dtypes (opcional) mapeia aba -> {coluna: dtype}.
+    Retorna {aba: DataFrame}, com None nas abas que não puderam ser lidas.
+    """
+    dtypes = dtypes or {}
+    results = get_storage_backend().read_batch(spreadsheet_url, requests)
+    return {worksheet_name: _apply_dtypes(df, dtypes.get(worksheet_name)) if df is not None else None
+            for worksheet_name, df in results.items()}
+
+def _read_row_at(spreadsheet_url, worksheet_name, row_index_df):
+    return _singleflight((spreadsheet_key(spreadsheet_url), worksheet_name, ("row", int(row_index_df))),
+                         lambda: get_storage_backend().read_row(spreadsheet_url, worksheet_name, row_index_df))
+
+@dataclass
+class CachedRow:
+    """Linha lida por read_sheet_row, servida de novo enquanto a revisão da planilha não mudar."""
+    position: int # Índice 0-based da linha na revisão `revision`
+    row: pd.Series
+    revision: str = None
+    checked_at: float = 0.0 # time.monotonic() da última confirmação da revisão
+
+_cached_rows = {} # (chave_planilha, aba, ID) -> CachedRow
+
+def _read_row_by_id(spreadsheet_url, worksheet_name, row_key):
+    """(posição, linha) da linha com o ID; (None, Series vazia) se não existir e (None, None) em caso de erro."""
+    position = resolve_row_key(spreadsheet_url, worksheet_name, row_key)
+    row = _read_row_at(spreadsheet_url, worksheet_name, position) if position is not None else pd.Series(dtype=object)
+    if row is not None and not row.empty and row.get(ROW_ID_COLUMN) != row_key:
+        # Linhas foram inseridas/movidas desde a construção do índice: reconstrói e lê de novo
+        position = resolve_row_key(spreadsheet_url, worksheet_name, row_key, verify=True)
+        row = _read_row_at(spreadsheet_url, worksheet_name, position) if position is not None else pd.Series(dtype=object)
+        if row is not None and not row.empty and row.get(ROW_ID_COLUMN) != row_key:
+            return None, pd.Series(dtype=object)
+    return (position, row) if row is not None and not row.empty else (None, row)
+
+def read_sheet_row(spreadsheet_url, worksheet_name, row_key, max_age=SNAPSHOT_TTL_SECONDS):
+    """
+    Lê uma única linha da aba e a retorna como Series indexada pelos cabeçalhos.
+    row_key é o ID da linha (str, ver ROW_ID_COLUMN) ou o índice 0-based do DataFrame
+    (a linha 2 da planilha é o índice 0).
+    Com um ID, a linha fica em cache no processo junto com a revisão da planilha em que foi lida:
+    por `max_age` segundos é servida sem nenhuma requisição; depois disso só a revisão é consultada
+    e a linha é relida apenas se ela mudou. Escritas feitas pelo app atualizam a cópia em cache
+    (ver _patch_cached_rows). A Series retornada é compartilhada e não deve ser modificada.
+    Retorna uma Series vazia se a linha não existir e None em caso de erro.
+    """
+    if not isinstance(row_key, str):
+        return _read_row_at(spreadsheet_url, worksheet_name, row_key)
+    cache_key = (spreadsheet_key(spreadsheet_url), worksheet_name, row_key)
+    cached = _cached_rows.get(cache_key)
+    if cached is not None and time.monotonic() - cached.checked_at < max_age:
+        return cached.row
+    # A revisão é lida antes da linha (como em get_sheet_snapshot)
+    revision = get_sheet_revision(spreadsheet_url)
+    if cached is not None and revision is not None and revision == cached.revision:
+        cached.checked_at = time.monotonic()
+        return cached.row
+    index = _row_indexes.get(cache_key[:2])
+    if cached is not None or (index is not None and revision != index.revision):
+        # A revisão mudou (ou não é conhecida): colunas podem ter sido inseridas, então a linha é lida com cabeçalhos novos
+        _forget_headers(spreadsheet_url, worksheet_name)
+    position, row = _read_row_by_id(spreadsheet_url, worksheet_name, row_key)
+    if position is None:
+        _cached_rows.pop(cache_key, None)
+        return row
+    _cached_rows[cache_key] = CachedRow(position=position, row=row, revision=revision, checked_at=time.monotonic())
+    return row
+
+def _cache_checked_row(spreadsheet_url, worksheet_name, row_key, position, row):
+    """
+    Guarda para read_sheet_row a linha recém-lida por _checked_row (ou descarta a cópia, se o ID
+    não existe mais), para que a próxima renderização mostre o valor atual mesmo quando a escrita
+    não acontece (ex.: conflito). A revisão fica desconhecida: depois de max_age a linha é relida.
+    """
+    cache_key = (spreadsheet_key(spreadsheet_url), worksheet_name, row_key)
+    if position is None:
+        _cached_rows.pop(cache_key, None)
+        return
+    _cached_rows[cache_key] = CachedRow(position=position, row=row, revision=None, checked_at=time.monotonic())
+
+def _patch_cached_rows(spreadsheet_url, worksheet_name, cells):
+    """
+    Aplica células recém-gravadas [(índice 0-based, coluna, valor)] às linhas em cache de read_sheet_row.
+    A posição de cada linha em cache é conferida no índice de IDs atual (a escrita acabou de usá-lo):
+    se a linha mudou de lugar, a cópia é descartada em vez de receber o valor de outra linha.
+    """
+    key = spreadsheet_key(spreadsheet_url)
+    index = _row_indexes.get((key, worksheet_name))
+    values_by_position = defaultdict(dict)
+    for position, col_name, value in cells:
+        values_by_position[int(position)][col_name] = _cell_value(value)
+    for cache_key, cached in list(_cached_rows.items()):
+        if cache_key[:2] != (key, worksheet_name):
+            continue
+        if index is not None and index.positions.get(cache_key[2]) != cached.position:
+            _cached_rows.pop(cache_key, None)
+            continue
+        values = values_by_position.get(cached.position)
+        if not values:
+            continue
+        row = cached.row.copy() # A Series antiga pode estar em uso por outra sessão
+        for col_name, value in values.items():
+            row[col_name] = value
+        _cached_rows[cache_key] = CachedRow(position=cached.position, row=row, revision=cached.revision,
+                                            checked_at=cached.checked_at)
+
+def _forget_cached_rows(spreadsheet_url=None, worksheet_name=None):
+    """Descarta as linhas em cache de read_sheet_row da aba indicada (ou de todas)."""
+    key = spreadsheet_key(spreadsheet_url) if spreadsheet_url else None
+    for cache_key in list(_cached_rows):
+        if (key is None or cache_key[0] == key) and (worksheet_name is None or cache_key[1] == worksheet_name):
+            _cached_rows.pop(cache_key, None)
+
+def write_dataframe_to_sheet(url, worksheet_name, dataframe):
+    """
+    Escreve um DataFrame em uma aba específica, substituindo o conteúdo existente.
+    No Google Sheets só as células que mudaram são enviadas (uma requisição values.batchUpdate).
+    """
+    ok = get_storage_backend().write_dataframe(url, worksheet_name, dataframe)
+    if ok:
+        # As linhas podem ter mudado de posição: snapshots e índice de IDs da aba são refeitos sob demanda
+        invalidate_sheet_snapshot(url, worksheet_name)
+        _row_indexes.pop((spreadsheet_key(url), worksheet_name), None)
+    return ok
+
+def append_row_to_sheet(url, worksheet_name, row_data_list):
+    """Adiciona uma nova linha (lista de valores) ao final de uma aba."""
+    return append_rows_to_sheet(url, worksheet_name, [row_data_list]) is not None
+
+def append_rows_to_sheet(url, worksheet_name, rows, chunk_size=APPEND_ROWS_PER_CHUNK):
+    """
+    Adiciona várias linhas (listas de valores) ao final da aba, com uma requisição por bloco
+    de chunk_size linhas. Se a aba tiver a coluna ROW_ID_COLUMN, as linhas sem ID recebem um novo.
+    Retorna os números das linhas na planilha (1-based, a linha 1 é o cabeçalho), na ordem de rows,
+    ou None em caso de erro (os blocos anteriores à falha continuam gravados).
+    Os snapshots em memória e o índice de IDs da aba são atualizados sem nova leitura.
+    """
+    rows = [list(row) for row in rows]
+    if not rows:
+        return []
+    headers = get_sheet_headers(url, worksheet_name)
+    if headers is None:
+        return None
+    if ROW_ID_COLUMN in headers:
+        id_position = headers.index(ROW_ID_COLUMN)
+        for row in rows:
+            row.extend([""] * (id_position + 1 - len(row)))
+            if row[id_position] is None or row[id_position] == "":
+                row[id_position] = uuid.uuid4().hex[:12]
+
+    backend = get_storage_backend()
+    row_numbers = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        chunk_numbers = backend.append_rows(url, worksheet_name, chunk)
+        if chunk_numbers is None:
+            if row_numbers:
+                st.error(f"{len(row_numbers)} de {len(rows)} linhas foram adicionadas à aba '{worksheet_name}' antes da falha.")
+            return None
+        _patch_appended_rows(url, worksheet_name, headers, chunk_numbers, chunk)
+        row_numbers.extend(chunk_numbers)
+    return row_numbers
+
+def update_cell_in_sheet(url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value, expected_value=None):
+    """
+    Atualiza uma célula específica na planilha.
+    row_index_df é o ID da linha (str, ver ROW_ID_COLUMN) ou o índice 0-based do DataFrame.
+    col_name_df é o nome da coluna no DataFrame.
+    df_reference_for_headers é um DataFrame que possui os cabeçalhos corretos para encontrar o índice da coluna
+    (ou None para usar os cabeçalhos cacheados da aba).
+    expected_value (opcional) é o valor que o usuário viu ao começar a editar: a célula é lida antes
+    da escrita e só é gravada se ainda tiver esse valor. Se outra pessoa a alterou nesse meio-tempo,
+    nada é gravado e o resultado vem com conflict=True e o valor atual em current_value.
+    Com um ID, a linha é lida junto com os cabeçalhos atuais para conferir o ID (e o valor esperado)
+    antes da escrita: uma leitura e uma escrita, sem consultar a revisão da planilha.
+    Retorna um CellUpdateResult, avaliado como True quando a escrita foi aplicada. Após a escrita,
+    os snapshots em memória da aba já mostram o novo valor (ver _patch_sheet_snapshots).
+    """
+    result = CellUpdateResult(row_index_df, col_name_df)
+    current_row = None
+    if isinstance(row_index_df, str):
+        position, current_row = _checked_row(url, worksheet_name, row_index_df)
+        if current_row is not None:
+            _cache_checked_row(url, worksheet_name, row_index_df, position, current_row)
+        if position is None:
+            if current_row is None:
+                result.error = f"Não foi possível ler a linha com {ROW_ID_COLUMN} '{row_index_df}' na aba '{worksheet_name}'."
+            else:
+                result.error = f"Linha com {ROW_ID_COLUMN} '{row_index_df}' não encontrada na aba '{worksheet_name}'."
+                st.error(result.error)
+            return result
+        row_index_df = position
+    backend = get_storage_backend()
+    if expected_value is not None:
+        # Concorrência otimista: o valor atual vem da linha já lida (ou de uma leitura de uma única célula)
+        if current_row is not None and col_name_df in current_row.index:
+            current_value = current_row.get(col_name_df)
+        else:
+            current_value = backend.read_cell(url, worksheet_name, row_index_df, col_name_df)
+        if current_value is None:
+            result.error = f"Não foi possível ler a célula '{col_name_df}' para conferir o valor atual."
+            return result
+        if current_value != _cell_value(expected_value):
+            result.conflict = True
+            result.current_value = current_value
+            result.error = f"A célula '{col_name_df}' foi alterada por outra pessoa desde o início da edição."
+            return result
+    result.ok = bool(backend.update_cell(url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value))
+    if result.ok:
+        _patch_sheet_snapshots(url, worksheet_name, [(row_index_df, col_name_df, new_value)])
+    return result
+
+def update_cells_batch(url, worksheet_name, updates, value_input_option="USER_ENTERED"):
+    """
+    Atualiza várias células da aba de uma só vez (no Google Sheets, uma única requisição values.batchUpdate).
+    updates é uma lista de (row_key, col_name, new_value), onde row_key é o ID da linha (str) ou o
+    índice 0-based do DataFrame. Retorna um CellUpdateResult por célula, na mesma ordem de updates.
+    Use value_input_option="RAW" para textos que o Sheets não deve converter (ex.: IDs que parecem números).
+    As células gravadas são aplicadas também aos snapshots em memória da aba.
+    """
+    updates = list(updates)
+    results = [CellUpdateResult(row_key, col_name) for row_key, col_name, _ in updates]
+    resolved = []
+    verify = True # Uma única verificação da revisão vale para todo o lote
+    for result, (row_key, col_name, new_value) in zip(results, updates):
+        if isinstance(row_key, str):
+            position = resolve_row_key(url, worksheet_name, row_key, verify=verify)
+            verify = False
+            if position is None:
+                result.error = f"Linha com {ROW_ID_COLUMN} '{row_key}' não encontrada."
+                continue
+            row_key = position
+        resolved.append((result, (row_key, col_name, new_value)))
+    if resolved:
+        backend_results = get_storage_backend().update_cells(url, worksheet_name, [update for _, update in resolved],
+                                                             value_input_option)
+        for (result, _), backend_result in zip(resolved, backend_results):
+            result.ok, result.error = backend_result.ok, backend_result.error
+        _patch_sheet_snapshots(url, worksheet_name, [update for result, update in resolved if result.ok])
+    return results
+
+
+# --- IDs estáveis de linha ---
+# Coluna com um identificador único por linha da aba. As páginas referenciam a linha pelo ID,
+# que não muda quando linhas são inseridas ou a aba é reordenada, e o índice ID -> posição
+# abaixo traduz o ID para a linha atual sem reler a aba inteira.
+ROW_ID_COLUMN = "ID"
+
+@dataclass
+class RowIndex:
+    """Posição (índice 0-based) de cada ID na aba, na revisão em que os IDs foram lidos."""
+    positions: dict
+    revision: str = None
+
+_row_indexes = {}  # (chave_planilha, aba) -> RowIndex
+_row_ids_lock = threading.Lock()
+
+def _positions_by_id(ids):
+    """{ID: posição} considerando a primeira ocorrência de cada ID não vazio."""
+    positions = {}
+    for position, row_id in enumerate(ids):
+        if row_id and row_id not in positions:
+            positions[row_id] = position
+    return positions
+
+def _set_row_index(spreadsheet_url, worksheet_name, ids, revision):
+    index = RowIndex(positions=_positions_by_id(ids), revision=revision)
+    _row_indexes[(spreadsheet_key(spreadsheet_url), worksheet_name)] = index
+    return index
+
+def _build_row_index(spreadsheet_url, worksheet_name, revision=None):
+    """Reconstrói o índice lendo apenas a coluna de IDs (uma requisição pequena)."""
+    if revision is None:
+        revision = get_sheet_revision(spreadsheet_url)
+    df = read_sheet_columns(spreadsheet_url, worksheet_name, [ROW_ID_COLUMN])
+    if df is None or ROW_ID_COLUMN not in df.columns:
+        return None
+    return _set_row_index(spreadsheet_url, worksheet_name, df[ROW_ID_COLUMN].tolist(), revision)
+
+def resolve_row_key(spreadsheet_url, worksheet_name, row_key, verify=False):
+    """
+    Traduz o ID da linha para o índice 0-based atual (índices numéricos são devolvidos como estão).
+    O índice fica em cache e só é reconstruído quando o ID não é encontrado ou, com verify=True
+    (usado antes de escritas), quando a revisão da planilha mudou desde a sua construção.
+    Retorna None se o ID não existir na aba.
+    """
+    if not isinstance(row_key, str):
+        return row_key
+    index = _row_indexes.get((spreadsheet_key(spreadsheet_url), worksheet_name))
+    revision = None
+    if index is not None and verify:
+        revision = get_sheet_revision(spreadsheet_url)
+        if revision is None or revision != index.revision:
+            index = None
+            # Colunas podem ter sido inseridas: a leitura dos IDs e a escrita que vem a seguir usam cabeçalhos novos
+            _forget_headers(spreadsheet_url, worksheet_name)
+    if index is None or row_key not in index.positions:
+        index = _build_row_index(spreadsheet_url, worksheet_name, revision)
+    if index is None:
+        return None
+    return index.positions.get(row_key)
+
+def _checked_row(spreadsheet_url, worksheet_name, row_id):
+    """
+    Localiza a linha do ID pelo índice cacheado e a lê com os cabeçalhos atuais (uma requisição),
+    conferindo o ID lido. Só quando ele não confere (linhas inseridas ou movidas) o índice é
+    reconstruído e a linha relida. Retorna (posição, Series da linha), (None, Series vazia) se o
+    ID não existir ou (None, None) em caso de erro de leitura.
+    """
+    backend = get_storage_backend()
+    position = resolve_row_key(spreadsheet_url, worksheet_name, row_id)
+    for attempt in range(2):
+        if position is None:
+            break
+        row = backend.read_row_fresh(spreadsheet_url, worksheet_name, position)
+        if row is None:
+            return None, None
+        if not row.empty and row.get(ROW_ID_COLUMN) == row_id:
+            return position, row
+        if attempt == 0:
+            index = _build_row_index(spreadsheet_url, worksheet_name)
+            position = index.positions.get(row_id) if index is not None else None
+    return None, pd.Series(dtype=object)
+
+def ensure_row_ids(spreadsheet_url, worksheet_name, row_count=None):
+    """
+    Grava IDs novos nas linhas da aba sem ID (ou com ID repetido), em uma única escrita em lote.
+    row_count é o número de linhas de dados da aba, se conhecido: a leitura só da coluna de IDs
+    não enxerga as linhas finais que ainda não têm ID.
+    Retorna quantos IDs foram gravados, ou None se a aba não tiver a coluna ROW_ID_COLUMN ou a escrita falhar.
+    """
+    with _row_ids_lock: # Evita que duas sessões gerem IDs diferentes para a mesma linha
+        revision = get_sheet_revision(spreadsheet_url)
+        df = read_sheet_columns(spreadsheet_url, worksheet_name, [ROW_ID_COLUMN])
+        if df is None or ROW_ID_COLUMN not in df.columns:
+            return None
+        ids = df[ROW_ID_COLUMN].tolist()
+        ids += [""] * max(0, (row_count or 0) - len(ids))
+
+        updates = []
+        seen = set()
+        for position, row_id in enumerate(ids):
+            if not row_id or row_id in seen:
+                row_id = ids[position] = uuid.uuid4().hex[:12]
+                updates.append((position, ROW_ID_COLUMN, row_id))
+            seen.add(row_id)
+        if updates:
+            # RAW: IDs como "001234567890" ou "123456789e01" virariam números com USER_ENTERED
+            results = update_cells_batch(spreadsheet_url, worksheet_name, updates, value_input_option="RAW")
+            failed = [result for result in results if not result]
+            if failed:
+                st.error(f"Falha ao gravar os IDs das linhas da aba '{worksheet_name}': {failed[0].error}")
+                return None
+            revision = None # A planilha mudou com a escrita; a próxima verificação relê a revisão
+        _set_row_index(spreadsheet_url, worksheet_name, ids, revision)
+        return len(updates)
+
+def normalize_text(value):
+    """Normalização usada em comparações de texto (ex.: e-mails): sem espaços nas pontas e minúscula."""
+    if value is None:
+        return None
+    return str(value).strip().lower()
+
+
+# --- Snapshot compartilhado por processo ---
+@dataclass
+class SheetSnapshot:
+    """
+    Cópia somente leitura de uma aba, compartilhada por todas as sessões do processo.
+    As visões de cada usuário são projeções sobre índices construídos sob demanda,
+    sem nova leitura da planilha. Os índices pertencem ao snapshot e, portanto, à
+    revisão da planilha em que ele foi lido. Escritas feitas pelo app não alteram o snapshot:
+    geram um novo, com as células atualizadas e version incrementada.
+    """
+    dataframe: pd.DataFrame
+    checked_at: float # Momento da última leitura ou revalidação da revisão
+    revision: str = None
+    version: int = 0 # Incrementada a cada escrita do próprio app aplicada sobre o snapshot
+    _indexes: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def index_by(self, column, normalize=None):
+        """Retorna {valor: posições das linhas} para a coluna, construído uma única vez."""
+        index_key = (column, normalize)
+        index = self._indexes.get(index_key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(index_key)
+                if index is None:
+                    values = self.dataframe[column]
+                    if normalize is not None:
+                        values = values.map(normalize)
+                    index = values.groupby(values, sort=False, observed=True).indices
+                    self._indexes[index_key] = index
+        return index
+
+    def select(self, column, value, normalize=None):
+        """Linhas cujo valor em `column` é igual a `value` (ambos normalizados por `normalize`)."""
+        if normalize is not None:
+            value = normalize(value)
+        positions = self.index_by(column, normalize).get(value)
+        if positions is None:
+            return self.dataframe.iloc[0:0]
+        return self.dataframe.iloc[positions]
+
+_snapshots = {}
+_disk_checked = set() # Chaves cuja cópia em disco já foi consultada neste processo
+_snapshot_locks = defaultdict(threading.Lock)
+_snapshot_locks_guard = threading.Lock()
+
+def _snapshot_lock(cache_key):
+    with _snapshot_locks_guard:
+        return _snapshot_locks[cache_key]
+
+def _snapshot_cache_key(spreadsheet_url, worksheet_name, columns, dtypes, schema=None):
+    return (spreadsheet_key(spreadsheet_url), worksheet_name,
+            tuple(columns) if columns else None, tuple(sorted(dtypes.items())) if dtypes else None,
+            schema.name if schema is not None else None)
+
+def _typed_snapshot_frame(df, dtypes, schema):
+    """Aplica ao DataFrame lido os dtypes e, se houver, o esquema declarado da aba (utils.schemas)."""
+    df = _apply_dtypes(df, dtypes)
+    return schema.apply(df) if schema is not None else df
+
+def _store_snapshot(cache_key, spreadsheet_url, worksheet_name, df, revision, persist):
+    """Registra o snapshot recém-lido (chamada com o lock da chave; a cópia em disco é gravada em segundo plano)."""
+    snapshot = SheetSnapshot(dataframe=df, checked_at=time.monotonic(), revision=revision)
+    _snapshots[cache_key] = snapshot
+    if ROW_ID_COLUMN in df.columns: # Aproveita a leitura para atualizar o índice de IDs
+        _set_row_index(spreadsheet_url, worksheet_name, df[ROW_ID_COLUMN].tolist(), revision)
+    if persist:
+        save_snapshot_in_background(cache_key, df, revision)
+    return snapshot
+
+def _refresh_snapshot_in_background(*args, **kwargs):
+    """Revalida o snapshot em uma thread separada (usado após servir a cópia do disco)."""
+    kwargs["max_age"] = 0
+
+    def refresh():
+        try:
+            with request_priority(PRIORITY_BACKGROUND): # Sessões de usuários têm preferência na cota
+                get_sheet_snapshot(*args, **kwargs)
+        except Exception as e: # Sem sessão nesta thread para exibir o erro; a cópia do disco continua valendo
+            logger.warning("Falha ao revalidar o snapshot em segundo plano: %s", e)
+
+    threading.Thread(target=refresh, name="sheets-snapshot-refresh", daemon=True).start()
+
+def get_sheet_snapshot(spreadsheet_url, worksheet_name, max_age=SNAPSHOT_TTL_SECONDS, columns=None, dtypes=None, persist=True,
+                       schema=None):
+    """
+    Retorna o snapshot compartilhado da aba (ou só das `columns` indicadas, se informadas),
+    com as colunas tipadas conforme `dtypes` (ver read_sheet_to_dataframe). Com `schema`
+    (um SheetSchema de utils.schemas), as colunas lidas, os nomes alternativos e os tipos
+    compactos vêm do esquema declarado da aba, e columns/dtypes não são usados.
+    Depois de `max_age` segundos, consulta apenas a revisão da planilha no Drive e só relê
+    os dados se ela mudou. Sessões concorrentes aguardam a mesma consulta em vez de
+    dispararem uma cada. Em caso de falha, mantém o último snapshot válido (ou None).
+    Use max_age=0 para forçar a revalidação.
+
+    Com persist=True, cada leitura completa é gravada em disco em segundo plano (utils.snapshot_store); na
+    primeira chamada do processo essa cópia é servida na hora enquanto uma thread verifica
+    se há dados mais novos. Use persist=False para abas com dados sensíveis.
+    """
+    if schema is not None:
+        columns, dtypes = schema.read_columns, None
+    cache_key = _snapshot_cache_key(spreadsheet_url, worksheet_name, columns, dtypes, schema)
+    snapshot = _snapshots.get(cache_key)
+    if snapshot is not None and time.monotonic() - snapshot.checked_at < max_age:
+        return snapshot
+
+    with _snapshot_lock(cache_key):
+        # Outra sessão pode ter revalidado enquanto esperávamos o lock
+        snapshot = _snapshots.get(cache_key)
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < max_age:
+            return snapshot
+
+        # Partida a frio: serve a última cópia gravada em disco (uma vez por processo)
+        if snapshot is None and persist and cache_key not in _disk_checked:
+            _disk_checked.add(cache_key)
+            stored = load_snapshot(cache_key)
+            if stored is not None:
+                df, revision, _ = stored
+                snapshot = SheetSnapshot(dataframe=_typed_snapshot_frame(df, dtypes, schema), checked_at=time.monotonic(), revision=revision)
+                _snapshots[cache_key] = snapshot
+                _refresh_snapshot_in_background(spreadsheet_url, worksheet_name, columns=columns, dtypes=dtypes, persist=persist,
+                                                schema=schema)
+                return snapshot
+
+        # A revisão é lida antes dos dados: se a planilha mudar entre as duas chamadas,
+        # a próxima revalidação verá uma revisão diferente e relerá os dados.
+        revision = get_sheet_revision(spreadsheet_url)
+        if snapshot is not None and revision is not None and revision == snapshot.revision:
+            snapshot.checked_at = time.monotonic()
+            return snapshot
+
+        # A revisão mudou: os cabeçalhos também podem ter mudado
+        _forget_headers(spreadsheet_url, worksheet_name)
+        if columns:
+            df = read_sheet_columns(spreadsheet_url, worksheet_name, columns, dtypes=dtypes)
+        else:
+            df = read_sheet_to_dataframe(spreadsheet_url, worksheet_name, dtypes=dtypes)
+        if df is None:
+            return snapshot
+        if schema is not None:
+            df = schema.apply(df)
+        return _store_snapshot(cache_key, spreadsheet_url, worksheet_name, df, revision, persist)
+
+def peek_sheet_snapshot(spreadsheet_url, worksheet_name, max_age=SNAPSHOT_TTL_SECONDS, columns=None, dtypes=None, schema=None):
+    """Snapshot da aba já em memória e dentro do prazo `max_age`, ou None; nunca consulta a API."""
+    if schema is not None:
+        columns, dtypes = schema.read_columns, None
+    snapshot = _snapshots.get(_snapshot_cache_key(spreadsheet_url, worksheet_name, columns, dtypes, schema))
+    if snapshot is not None and time.monotonic() - snapshot.checked_at < max_age:
+        return snapshot
+    return None
+
+def seed_sheet_snapshot(spreadsheet_url, worksheet_name, dataframe, revision, columns=None, dtypes=None, persist=True,
+                        schema=None):
+    """
+    Registra como snapshot da aba um DataFrame já lido por outro caminho (ex.: read_sheets_batch),
+    com os mesmos columns/dtypes (ou schema) que get_sheet_snapshot usará depois. `revision` deve ter
+    sido consultada antes da leitura. Um snapshot ainda dentro do prazo de validade não é substituído.
+    """
+    if schema is not None:
+        columns, dtypes = schema.read_columns, None
+    cache_key = _snapshot_cache_key(spreadsheet_url, worksheet_name, columns, dtypes, schema)
+    with _snapshot_lock(cache_key):
+        snapshot = _snapshots.get(cache_key)
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < SNAPSHOT_TTL_SECONDS:
+            return snapshot
+        _disk_checked.add(cache_key) # A cópia em disco seria mais antiga que esta leitura
+        return _store_snapshot(cache_key, spreadsheet_url, worksheet_name, _typed_snapshot_frame(dataframe, dtypes, schema),
+                               revision, persist)
+
+def refresh_sheet_snapshot(spreadsheet_url, worksheet_name, min_interval=REFRESH_MIN_INTERVAL_SECONDS, **kwargs):
+    """
+    Revalidação pedida pelo usuário: afeta só o snapshot indicado (mesmos columns/dtypes/schema de
+    get_sheet_snapshot) e no máximo uma vez a cada `min_interval` segundos. Cliques durante uma
+    revalidação em andamento aguardam e recebem o resultado dela; cliques logo depois recebem
+    o snapshot recém-verificado sem nova consulta.
+    """
+    return get_sheet_snapshot(spreadsheet_url, worksheet_name, max_age=min_interval, **kwargs)
+
+def invalidate_sheet_snapshot(spreadsheet_url=None, worksheet_name=None):
+    """Descarta os snapshots da aba indicada (ou de todas, se nada for informado) e as linhas em cache dela."""
+    _forget_cached_rows(spreadsheet_url, worksheet_name)
+    key = spreadsheet_key(spreadsheet_url) if spreadsheet_url else None
+    for cache_key in list(_snapshots):
+        if (key is None or cache_key[0] == key) and (worksheet_name is None or cache_key[1] == worksheet_name):
+            _snapshots.pop(cache_key, None)
+
+def _patched_dataframe(df, cells):
+    """Cópia de df com as células [(posição, coluna, valor)] substituídas, preservando os dtypes possíveis."""
+    df = df.copy()
+    for position, col_name, new_value in cells:
+        loc = df.columns.get_loc(col_name)
+        value = _cell_value(new_value) # O texto que a planilha passa a conter
+        column = df.iloc[:, loc]
+        if isinstance(column.dtype, pd.CategoricalDtype) and value not in column.cat.categories:
+            df.isetitem(loc, column.cat.add_categories([value]))
+        elif pd.api.types.is_datetime64_any_dtype(column.dtype): # O pandas interpretaria o texto como data no formato americano
+            df.isetitem(loc, column.astype(object))
+        try:
+            df.iat[position, loc] = value
+        except (TypeError, ValueError): # Coluna tipada (ex.: datas) que não aceita o texto
+            df.isetitem(loc, df.iloc[:, loc].astype(object))
+            df.iat[position, loc] = value
+    return df
+
+def _patch_sheet_snapshots(spreadsheet_url, worksheet_name, cells):
+    """
+    Aplica células recém-gravadas [(índice 0-based, coluna, valor)] aos snapshots em memória
+    da aba (e às linhas em cache de read_sheet_row), para que a próxima renderização mostre a
+    alteração sem reler a planilha.
+    Cada snapshot afetado é substituído por uma cópia com version + 1; a revisão é mantida,
+    de modo que a revalidação seguinte ainda detecta alterações feitas por outras pessoas.
+    Snapshots que não contêm a linha (ex.: linha nova) são descartados.
+    """
+    if not cells:
+        return
+    _patch_cached_rows(spreadsheet_url, worksheet_name, cells)
+    key = spreadsheet_key(spreadsheet_url)
+    for cache_key in [cache_key for cache_key in list(_snapshots) if cache_key[:2] == (key, worksheet_name)]:
+        with _snapshot_lock(cache_key):
+            snapshot = _snapshots.get(cache_key)
+            if snapshot is None:
+                continue
+            df = snapshot.dataframe
+            relevant = [(int(position), col_name, value) for position, col_name, value in cells
+                        if col_name in df.columns and isinstance(df.columns.get_loc(col_name), int)] # Nomes repetidos são ignorados
+            if not relevant:
+                continue
+            if any(position >= len(df) for position, _, _ in relevant):
+                _snapshots.pop(cache_key, None)
+                continue
+            patched_columns = {col_name for _, col_name, _ in relevant}
+            _snapshots[cache_key] = SheetSnapshot(
+                dataframe=_patched_dataframe(df, relevant),
+                checked_at=snapshot.checked_at,
+                revision=snapshot.revision,
+                version=snapshot.version + 1,
+                _indexes={index_key: index for index_key, index in snapshot._indexes.items() if index_key[0] not in patched_columns},
+            )
+
+def _restore_dtypes(df, dtypes):
+    """Reaplica a df os dtypes originais (`dtypes`, por posição) que o concat tiver perdido."""
+    for loc, dtype in enumerate(dtypes):
+        if df.dtypes.iloc[loc] == dtype or pd.api.types.is_datetime64_any_dtype(dtype): # Texto de data fica como object (ver _patched_dataframe)
+            continue
+        try:
+            df.isetitem(loc, df.iloc[:, loc].astype("category" if isinstance(dtype, pd.CategoricalDtype) else dtype))
+        except (TypeError, ValueError):
+            pass # Mantém object se os novos valores não couberem no dtype original
+    return df
+
+def _patch_appended_rows(spreadsheet_url, worksheet_name, headers, row_numbers, rows):
+    """
+    Acrescenta linhas recém-adicionadas à aba aos snapshots em memória e ao índice de IDs.
+    Snapshots que não terminam exatamente antes das novas linhas (ex.: outra pessoa também
+    adicionou linhas) são descartados e relidos sob demanda.
+    """
+    positions = [row_number - 2 for row_number in row_numbers]
+    key = spreadsheet_key(spreadsheet_url)
+
+    index = _row_indexes.get((key, worksheet_name))
+    if index is not None and ROW_ID_COLUMN in headers:
+        id_position = headers.index(ROW_ID_COLUMN)
+        for position, row in zip(positions, rows):
+            index.positions.setdefault(_cell_value(row[id_position]), position)
+
+    for cache_key in [cache_key for cache_key in list(_snapshots) if cache_key[:2] == (key, worksheet_name)]:
+        with _snapshot_lock(cache_key):
+            snapshot = _snapshots.get(cache_key)
+            if snapshot is None:
+                continue
+            df = snapshot.dataframe
+            if positions != list(range(len(df), len(df) + len(rows))) or any(col not in headers for col in df.columns):
+                _snapshots.pop(cache_key, None)
+                continue
+            col_positions = [headers.index(col) for col in df.columns]
+            new_rows = pd.DataFrame([[_cell_value(row[col]) if col < len(row) else "" for col in col_positions] for row in rows],
+                                    columns=df.columns, dtype=object)
+            _snapshots[cache_key] = SheetSnapshot(
+                dataframe=_restore_dtypes(pd.concat([df, new_rows], ignore_index=True), df.dtypes),
+                checked_at=snapshot.checked_at,
+                revision=snapshot.revision,
+                version=snapshot.version + 1,
+            )
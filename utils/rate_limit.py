@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Cota do Google Sheets: 60 requisições por minuto por usuário (a conta de serviço é um único usuário)
+REQUESTS_PER_MINUTE = 60
+# Fração do balde reservada às requisições interativas: as de segundo plano só passam acima dela
+BACKGROUND_RESERVE = 0.25
+
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+_context = threading.local()
+
+
+class TokenBucket:
+    """
+    Balde de fichas compartilhado pelo processo: `rate_per_minute` fichas por minuto,
+    acumulando até `capacity`. Requisições de segundo plano deixam uma reserva para
+    as interativas, que por isso passam na frente quando o balde está baixo.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, background_reserve=BACKGROUND_RESERVE):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.background_reserve = self.capacity * background_reserve
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """Bloqueia até haver uma ficha disponível para a prioridade indicada e a consome."""
+        needed = 1 + (self.background_reserve if priority == PRIORITY_BACKGROUND else 0)
+        with self._condition:
+            while True:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= 1
+                    return
+                self._condition.wait((needed - self._tokens) / self.rate_per_second)
+
+    def drain(self):
+        """Esvazia o balde (usado quando a API responde 429: a cota real já acabou)."""
+        with self._condition:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+
+_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+
+
+@contextmanager
+def request_priority(priority):
+    """Define a prioridade das requisições feitas pela thread atual dentro do bloco."""
+    previous = getattr(_context, "priority", PRIORITY_INTERACTIVE)
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+def current_priority():
+    return getattr(_context, "priority", PRIORITY_INTERACTIVE)
+
+def _retry_after_seconds(response):
+    """Lê o cabeçalho Retry-After (em segundos ou como data HTTP), se presente."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _is_idempotent(method, url):
+    """Requisições que podem ser repetidas com segurança após um erro 5xx (um append, por exemplo, não pode)."""
+    return method.upper() in ("GET", "HEAD", "PUT") or "/values:batchGet" in url or "/values:batchUpdate" in url
+
+def _backoff_seconds(attempt):
+    """Backoff exponencial com jitter completo."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def install_rate_limiter(session):
+    """
+    Envolve session.request (requests.Session usada pelo gspread) com o limitador de taxa do
+    processo e com novas tentativas: 429 sempre, 5xx e falhas de conexão apenas em requisições
+    idempotentes, respeitando Retry-After quando a API o envia. Idempotente: instala uma vez só.
+    """
+    if getattr(session, "_rate_limited", False):
+        return session
+    send = session.request
+
+    def request(method, url, *args, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            _bucket.acquire(current_priority())
+            try:
+                response = send(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == MAX_RETRIES or not _is_idempotent(method, url):
+                    raise
+                time.sleep(_backoff_seconds(attempt))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+            if response.status_code != 429 and not _is_idempotent(method, url):
+                return response
+            if response.status_code == 429:
+                _bucket.drain()
+            delay = _retry_after_seconds(response)
+            time.sleep(delay if delay is not None else _backoff_seconds(attempt))
+        return response
+
+    session.request = request
+    session._rate_limited = True
+    return session
@@ -0,0 +1,158 @@
+import logging
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from utils.google_sheets import ROW_ID_COLUMN
+
+try: # Texto em memória Arrow (bem mais compacto que objetos str do Python), se o pyarrow estiver instalado
+    import pyarrow # noqa: F401 (o Streamlit já depende dele)
+    TEXT_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    TEXT_DTYPE = object
+
+# Tipos lógicos aceitos nos esquemas
+CATEGORY = "category" # Poucos valores distintos repetidos (setor, status...)
+TEXT = "text"         # Texto livre
+DATE = "date"         # Datas; se algum valor não for uma data, a coluna fica como texto
+
+# Formatos de data aceitos, em ordem (o último é o formato em que o snapshot em disco guarda as datas)
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SheetSchema:
+    """
+    Esquema declarado de uma aba: quais colunas ler, o tipo lógico de cada uma (as demais
+    ficam como `default_dtype`) e os nomes alternativos de cada coluna, resolvidos uma única
+    vez na carga. Passado como `schema=` para get_sheet_snapshot e funções relacionadas.
+    """
+    name: str
+    columns: tuple = None # Colunas canônicas a ler; None lê a aba inteira
+    dtypes: dict = field(default_factory=dict, hash=False)
+    aliases: dict = field(default_factory=dict, hash=False) # coluna canônica -> nomes alternativos na planilha
+    default_dtype: str = TEXT
+
+    @property
+    def read_columns(self):
+        """Colunas a pedir à planilha: as canônicas e todos os seus nomes alternativos (ou None)."""
+        if self.columns is None:
+            return None
+        names = []
+        for col in self.columns:
+            names += [col] + [alias for alias in self.aliases.get(col, ()) if alias not in names]
+        return names
+
+    def apply(self, df):
+        """
+        Retorna uma cópia de df com os nomes alternativos resolvidos e as colunas convertidas para
+        os tipos compactos. Idempotente: pode ser aplicado a um DataFrame já convertido (ex.: snapshot em disco).
+        """
+        typed = _convert_columns(_resolve_aliases(df, self.aliases), self.dtypes, self.default_dtype)
+        if len(df) and logger.isEnabledFor(logging.DEBUG): # memory_usage(deep=True) percorre todos os valores
+            logger.debug("%s: %.0f -> %.0f bytes por linha (%d linhas)", self.name, _bytes_per_row(df), _bytes_per_row(typed), len(df))
+        return typed
+
+    def memory_report(self, raw):
+        """
+        Bytes por linha de cada coluna antes (texto cru da planilha, ex.: read_sheet_columns com
+        read_columns) e depois do esquema, com o total na última linha.
+        """
+        rows = max(len(raw), 1)
+        before = _resolve_aliases(raw, self.aliases) # Mesmos nomes de coluna nos dois lados
+        report = pd.DataFrame({
+            "antes": before.memory_usage(deep=True, index=False).groupby(level=0, sort=False).sum() / rows,
+            "depois": self.apply(raw).memory_usage(deep=True, index=False).groupby(level=0, sort=False).sum() / rows,
+        })
+        report.loc["total"] = report.sum()
+        return report
+
+
+def _column_at(df, name):
+    """Primeira coluna com o nome (a planilha pode ter cabeçalhos repetidos)."""
+    return df.iloc[:, list(df.columns).index(name)]
+
+def _resolve_aliases(df, aliases):
+    """Une cada coluna canônica com seus nomes alternativos: vale o primeiro valor não vazio, na ordem declarada."""
+    df = df.copy()
+    for canonical, alternatives in aliases.items():
+        present = [name for name in (canonical, *alternatives) if name in df.columns]
+        if not present:
+            continue
+        merged = _column_at(df, present[0])
+        for name in present[1:]:
+            blank = merged.isna() | (merged.astype(object) == "")
+            merged = merged.astype(object).where(~blank, _column_at(df, name).astype(object))
+        df = df.drop(columns=present[1:])
+        df.isetitem(list(df.columns).index(present[0]), merged)
+        df = df.rename(columns={present[0]: canonical})
+    return df
+
+def _parse_dates(values):
+    """Converte a coluna de texto em datas, ou retorna None se algum valor não vazio não for uma data."""
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values
+    text = values.astype(object).where(values.notna(), "").astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for date_format in DATE_FORMATS:
+        pending = parsed.isna() & (text != "")
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(text[pending], format=date_format, errors="coerce")
+    return parsed if not (parsed.isna() & (text != "")).any() else None
+
+def _convert_columns(df, dtypes, default_dtype):
+    for loc, col in enumerate(df.columns):
+        values = df.iloc[:, loc]
+        kind = dtypes.get(col, default_dtype)
+        if kind == DATE:
+            parsed = _parse_dates(values)
+            if parsed is not None:
+                df.isetitem(loc, parsed)
+                continue
+            kind = TEXT
+        if isinstance(values.dtype, pd.CategoricalDtype) and kind == CATEGORY:
+            continue
+        values = values.astype(object).where(values.notna(), "") # Célula vazia da planilha é "", não NA
+        df.isetitem(loc, values.astype("category" if kind == CATEGORY else TEXT_DTYPE))
+    return df
+
+def _bytes_per_row(df):
+    return df.memory_usage(deep=True, index=False).sum() / max(len(df), 1)
+
+def format_value(value):
+    """Texto para exibição de um valor do snapshot: datas como dd/mm/aaaa e vazios como ''."""
+    if value is None or value is pd.NaT or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%d/%m/%Y")
+    return str(value)
+
+
+# Abas da planilha do cronograma PPR
+CRONOGRAMA_SHEET_NAME = "Cronograma"
+USERS_SHEET_NAME = "Usuários"
+
+# Colunas do Cronograma usadas pelo painel (app.py); apenas elas são baixadas da planilha
+DASHBOARD_SCHEMA = SheetSchema(
+    name="cronograma-painel",
+    columns=(ROW_ID_COLUMN, 'Referência', 'Setor', 'Responsável', 'Descrição Meta', 'Responsável Área', 'E-mail') + tuple(
+        col for n in range(1, 7) for col in (f'{n}º Entrega', f'{n}º Avaliação', f'Validação {n}º Entrega')
+    ),
+    dtypes={
+        # Poucos valores distintos: categoria (menos memória e filtros mais rápidos)
+        'Referência': CATEGORY, 'Setor': CATEGORY, 'Responsável': CATEGORY, 'Responsável Área': CATEGORY, 'E-mail': CATEGORY,
+        **{f'Validação {n}º Entrega': CATEGORY for n in range(1, 7)},
+        **{f'{n}º Entrega': DATE for n in range(1, 7)},
+    },
+    aliases={'E-mail': ('e-mail', 'Email')},
+)
+
+# Aba Usuários (lida inteira; mantida só em memória, pois contém senhas)
+USERS_SCHEMA = SheetSchema(
+    name="usuarios",
+    dtypes={'Tipo de Usuário': CATEGORY},
+    aliases={'Email': ('E-mail', 'e-mail')},
+)
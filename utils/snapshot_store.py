@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Arquivo local (SQLite) com o último snapshot válido de cada aba, usado para servir a
+# primeira renderização após um deploy/reinício sem esperar pela API do Google.
+SNAPSHOT_STORE_PATH = os.environ.get(
+    "SNAPSHOT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "sheet_snapshots.sqlite3"),
+)
+
+_store_lock = threading.Lock()
+
+# Gravações agendadas por save_snapshot_in_background: só a mais recente de cada chave é mantida
+_pending_saves = {} # chave do snapshot -> (dataframe, revisão)
+_pending_lock = threading.Lock()
+_pending_ready = threading.Event()
+_writer = None
+
+
+@contextmanager
+def _connect():
+    """Abre o arquivo (criando a tabela se preciso), confirma a transação e fecha a conexão."""
+    os.makedirs(os.path.dirname(SNAPSHOT_STORE_PATH), exist_ok=True)
+    connection = sqlite3.connect(SNAPSHOT_STORE_PATH, timeout=10)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """CREATE TABLE IF NOT EXISTS snapshots (
+                   cache_key TEXT PRIMARY KEY,
+                   revision TEXT,
+                   saved_at REAL NOT NULL,
+                   columns TEXT NOT NULL,
+                   data TEXT NOT NULL
+               )"""
+        )
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def _serialize_key(cache_key):
+    return json.dumps(cache_key, ensure_ascii=False)
+
+def save_snapshot(cache_key, dataframe, revision):
+    """
+    Grava o snapshot no disco (substituindo o anterior da mesma chave).
+    Os dados são guardados por coluna, como listas em um único texto JSON (sem tipos nativos:
+    os dtypes são reaplicados por quem carrega).
+    Retorna False se a gravação falhar (o cache em disco é apenas uma otimização).
+    """
+    columns = [str(col) for col in dataframe.columns]
+    data = [dataframe.iloc[:, position].astype(object).where(dataframe.iloc[:, position].notna(), None).tolist()
+            for position in range(len(columns))]
+    try:
+        with _store_lock, _connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots (cache_key, revision, saved_at, columns, data) VALUES (?, ?, ?, ?, ?)",
+                (_serialize_key(cache_key), revision, time.time(), json.dumps(columns, ensure_ascii=False),
+                 json.dumps(data, ensure_ascii=False, default=str)), # Datas viram "AAAA-MM-DD HH:MM:SS"
+            )
+        return True
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        logger.warning("Falha ao gravar snapshot em disco: %s", e)
+        return False
+
+def save_snapshot_in_background(cache_key, dataframe, revision):
+    """
+    Agenda save_snapshot em uma thread própria e retorna imediatamente, para que a serialização
+    e a escrita no SQLite não ocorram com o lock do snapshot em mãos. Uma gravação ainda pendente
+    da mesma chave é substituída pela nova. O DataFrame não deve ser alterado depois (os snapshots
+    são substituídos por cópias, nunca modificados).
+    """
+    global _writer
+    with _pending_lock:
+        _pending_saves[cache_key] = (dataframe, revision)
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="snapshot-store-writer", daemon=True)
+            _writer.start()
+    _pending_ready.set()
+
+def _writer_loop():
+    while True:
+        _pending_ready.wait()
+        _pending_ready.clear()
+        while True:
+            with _pending_lock:
+                if not _pending_saves:
+                    break
+                cache_key = next(iter(_pending_saves))
+                dataframe, revision = _pending_saves.pop(cache_key)
+            save_snapshot(cache_key, dataframe, revision) # Já registra a falha, se houver
+
+def load_snapshot(cache_key):
+    """Retorna (dataframe, revisão, gravado_em) do último snapshot salvo, ou None se não houver."""
+    if not os.path.exists(SNAPSHOT_STORE_PATH):
+        return None
+    try:
+        with _store_lock, _connect() as connection:
+            row = connection.execute(
+                "SELECT revision, saved_at, columns, data FROM snapshots WHERE cache_key = ?",
+                (_serialize_key(cache_key),),
+            ).fetchone()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Falha ao ler snapshot do disco: %s", e)
+        return None
+    if row is None:
+        return None
+    revision, saved_at, columns, data = row
+    columns = json.loads(columns)
+    data = json.loads(data)
+    dataframe = pd.DataFrame(dict(zip(range(len(columns)), data)), columns=range(len(columns)))
+    dataframe.columns = columns
+    return dataframe, revision, saved_at
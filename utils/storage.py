@@ -0,0 +1,453 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import gspread
+import pandas as pd
+import streamlit as st
+
+
+def spreadsheet_key(url):
+    """Extrai a chave da planilha da URL (URLs com gids diferentes apontam para a mesma planilha)."""
+    try:
+        return gspread.utils.extract_id_from_url(url)
+    except gspread.exceptions.NoValidUrlKeyFound:
+        return url
+
+def _to_text(value):
+    """Converte o valor para texto, como a planilha o guardaria (None/NaN viram célula vazia)."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value)
+
+
+def _slice_a1(dataframe, a1_notation):
+    """
+    Recorta o intervalo A1 da aba representada pelo DataFrame (o cabeçalho é a linha 1);
+    a primeira linha do recorte vira o cabeçalho do resultado.
+    """
+    grid_range = gspread.utils.a1_range_to_grid_range(a1_notation)
+    grid = [list(dataframe.columns)] + dataframe.astype(object).values.tolist()
+    first_col, last_col = grid_range.get("startColumnIndex", 0), grid_range.get("endColumnIndex")
+    rows = [row[first_col:last_col] for row in grid[grid_range.get("startRowIndex", 0):grid_range.get("endRowIndex")]]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows[1:], columns=rows[0])
+
+
+@dataclass
+class CellUpdateResult:
+    """Resultado da escrita de uma célula; avaliado como True quando a escrita foi aplicada."""
+    row_key: object
+    column: str
+    ok: bool = False
+    error: str = None
+    conflict: bool = False # Escrita condicional recusada: a célula não tinha mais o valor esperado
+    current_value: str = None # Valor encontrado na célula quando houve conflito
+
+    def __bool__(self):
+        return self.ok
+
+
+class StorageBackend:
+    """
+    Interface de armazenamento usada pelas funções públicas de utils.google_sheets.
+    As abas são identificadas por (url da planilha, nome da aba) e as linhas pelo índice
+    0-based do DataFrame (a linha 2 da planilha é o índice 0), como no Google Sheets.
+    Erros são exibidos com st.error/st.warning e sinalizados com None/False.
+    """
+    name = None
+
+    def get_revision(self, url):
+        """Identificador da revisão atual da planilha (muda a cada escrita), ou None."""
+        raise NotImplementedError
+
+    def get_headers(self, url, worksheet_name):
+        """Lista de cabeçalhos da aba, ou None se a aba não existir/não puder ser lida."""
+        raise NotImplementedError
+
+    def read_dataframe(self, url, worksheet_name):
+        """A aba inteira como DataFrame (colunas = cabeçalhos), ou None em caso de erro."""
+        raise NotImplementedError
+
+    def read_columns(self, url, worksheet_name, columns):
+        """Apenas as colunas indicadas que existirem na aba, ou None em caso de erro."""
+        raise NotImplementedError
+
+    def read_row(self, url, worksheet_name, row_index_df):
+        """Uma linha como Series (vazia se a linha não existir), ou None em caso de erro."""
+        raise NotImplementedError
+
+    def read_row_fresh(self, url, worksheet_name, row_index_df):
+        """
+        Como read_row, mas com os cabeçalhos relidos na mesma leitura (usado para conferir o ID da
+        linha antes de uma escrita). Implementação padrão: read_row, para backends sem cache de cabeçalhos.
+        """
+        return self.read_row(url, worksheet_name, row_index_df)
+
+    def read_cell(self, url, worksheet_name, row_index_df, col_name_df):
+        """O texto de uma única célula ('' se vazia), ou None em caso de erro."""
+        raise NotImplementedError
+
+    def iter_chunks(self, url, worksheet_name, rows_per_chunk):
+        """Gera a aba em DataFrames de até rows_per_chunk linhas (índice = posição); None sinaliza erro."""
+        raise NotImplementedError
+
+    def read_batch(self, url, requests):
+        """
+        Várias abas de uma vez: {aba: None (aba inteira), lista de colunas ou intervalo A1}
+        -> {aba: DataFrame ou None}. Implementação padrão: uma leitura por aba.
+        """
+        results = {}
+        for worksheet_name, request in requests.items():
+            if isinstance(request, (list, tuple)):
+                results[worksheet_name] = self.read_columns(url, worksheet_name, request)
+                continue
+            df = self.read_dataframe(url, worksheet_name)
+            results[worksheet_name] = _slice_a1(df, request) if df is not None and request is not None else df
+        return results
+
+    def write_dataframe(self, url, worksheet_name, dataframe):
+        """Substitui o conteúdo da aba pelo DataFrame. Retorna True/False."""
+        raise NotImplementedError
+
+    def append_rows(self, url, worksheet_name, rows):
+        """Adiciona as linhas ao final da aba; retorna seus números na planilha (1-based) ou None."""
+        raise NotImplementedError
+
+    def update_cell(self, url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value):
+        """Atualiza uma célula. Retorna True/False."""
+        raise NotImplementedError
+
+    def update_cells(self, url, worksheet_name, updates, value_input_option="USER_ENTERED"):
+        """
+        Atualiza várias células [(row_key, coluna, valor)]; retorna um CellUpdateResult por célula.
+        value_input_option="RAW" grava o texto como está, sem a interpretação do Sheets (números, datas, fórmulas).
+        """
+        raise NotImplementedError
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend local em SQLite. Cada aba vira uma tabela com uma coluna de texto por cabeçalho,
+    chaveada pela posição da linha (busca indexada por linha) e todas as escritas são
+    transacionais. Útil quando as cotas do Google Sheets não bastam e para testes de carga offline.
+    Uma aba passa a existir ao ser gravada com write_dataframe_to_sheet.
+    """
+    name = "sqlite"
+    DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_data.sqlite3")
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        """Abre uma conexão (uma por operação), confirma a transação ao final e fecha."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sheet_headers ("
+                "sheet TEXT NOT NULL, position INTEGER NOT NULL, name TEXT NOT NULL, PRIMARY KEY (sheet, position))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sheet_revisions (spreadsheet TEXT PRIMARY KEY, revision INTEGER NOT NULL)"
+            )
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _sheet_id(url, worksheet_name):
+        return f"{spreadsheet_key(url)}/{worksheet_name}"
+
+    @staticmethod
+    def _table_name(sheet_id):
+        return f"sheet:{sheet_id}"
+
+    def _table(self, sheet_id):
+        """Nome da tabela da aba, entre aspas para uso direto no SQL."""
+        return '"{}"'.format(self._table_name(sheet_id).replace('"', '""'))
+
+    @staticmethod
+    def _column(position):
+        return f"c{position}" # Posição 1-based do cabeçalho (os nomes podem se repetir)
+
+    def _headers(self, connection, sheet_id):
+        rows = connection.execute(
+            "SELECT name FROM sheet_headers WHERE sheet = ? ORDER BY position", (sheet_id,)
+        ).fetchall()
+        return [name for (name,) in rows]
+
+    def _sheet_exists(self, connection, sheet_id):
+        return connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self._table_name(sheet_id),)
+        ).fetchone() is not None
+
+    def _bump_revision(self, connection, url):
+        connection.execute(
+            "INSERT INTO sheet_revisions (spreadsheet, revision) VALUES (?, 1) "
+            "ON CONFLICT(spreadsheet) DO UPDATE SET revision = revision + 1",
+            (spreadsheet_key(url),),
+        )
+
+    def _add_columns(self, connection, sheet_id, headers, count):
+        """Acrescenta colunas sem cabeçalho até a aba ter `count` colunas (como o Sheets faz ao receber linhas longas)."""
+        for position in range(len(headers) + 1, count + 1):
+            connection.execute(f"ALTER TABLE {self._table(sheet_id)} ADD COLUMN {self._column(position)} TEXT NOT NULL DEFAULT ''")
+            connection.execute("INSERT INTO sheet_headers (sheet, position, name) VALUES (?, ?, '')", (sheet_id, position))
+            headers.append("")
+
+    def _missing_sheet(self, url, worksheet_name):
+        st.warning(f"Aba '{worksheet_name}' não encontrada na planilha {url}.")
+
+    def get_revision(self, url):
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT revision FROM sheet_revisions WHERE spreadsheet = ?", (spreadsheet_key(url),)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return f"sqlite:{row[0] if row else 0}"
+
+    def get_headers(self, url, worksheet_name):
+        sheet_id = self._sheet_id(url, worksheet_name)
+        try:
+            with self._connect() as connection:
+                if not self._sheet_exists(connection, sheet_id):
+                    self._missing_sheet(url, worksheet_name)
+                    return None
+                return self._headers(connection, sheet_id)
+        except sqlite3.Error as e:
+            st.error(f"Erro ao ler os cabeçalhos da aba '{worksheet_name}': {e}")
+            return None
+
+    def _select(self, url, worksheet_name, columns=None):
+        """Lê (cabeçalhos, posições das colunas selecionadas, linhas ordenadas por _row)."""
+        sheet_id = self._sheet_id(url, worksheet_name)
+        with self._connect() as connection:
+            if not self._sheet_exists(connection, sheet_id):
+                self._missing_sheet(url, worksheet_name)
+                return None
+            headers = self._headers(connection, sheet_id)
+            if columns is None:
+                positions = list(range(1, len(headers) + 1))
+            else:
+                positions = [headers.index(col) + 1 for col in dict.fromkeys(columns) if col in headers]
+            selected = ", ".join(["_row"] + [self._column(position) for position in positions])
+            rows = connection.execute(f"SELECT {selected} FROM {self._table(sheet_id)} ORDER BY _row").fetchall()
+        return headers, positions, rows
+
+    def _to_dataframe(self, names, rows):
+        """Monta o DataFrame preenchendo com '' as linhas nunca gravadas (lacunas de _row)."""
+        df = pd.DataFrame([row[1:] for row in rows], columns=names, index=[row[0] for row in rows], dtype=object)
+        if rows and len(rows) != rows[-1][0] + 1:
+            df = df.reindex(range(rows[-1][0] + 1), fill_value="")
+        return df.reset_index(drop=True).infer_objects()
+
+    def read_dataframe(self, url, worksheet_name):
+        try:
+            selection = self._select(url, worksheet_name)
+            if selection is None:
+                return None
+            headers, _, rows = selection
+            if not headers:
+                st.warning(f"A aba '{worksheet_name}' em {url} não contém cabeçalhos.")
+                return pd.DataFrame()
+            return self._to_dataframe(headers, rows)
+        except sqlite3.Error as e:
+            st.error(f"Erro ao converter a aba '{worksheet_name}' para DataFrame: {e}")
+            return None
+
+    def read_columns(self, url, worksheet_name, columns):
+        try:
+            selection = self._select(url, worksheet_name, columns)
+            if selection is None:
+                return None
+            headers, positions, rows = selection
+            return self._to_dataframe([headers[position - 1] for position in positions], rows)
+        except sqlite3.Error as e:
+            st.error(f"Erro ao ler colunas da aba '{worksheet_name}': {e}")
+            return None
+
+    def read_row(self, url, worksheet_name, row_index_df):
+        sheet_id = self._sheet_id(url, worksheet_name)
+        try:
+            row_index = int(row_index_df)
+        except (TypeError, ValueError):
+            st.error(f"Índice da linha inválido: {row_index_df}")
+            return None
+        try:
+            with self._connect() as connection:
+                if not self._sheet_exists(connection, sheet_id):
+                    self._missing_sheet(url, worksheet_name)
+                    return None
+                headers = self._headers(connection, sheet_id)
+                row = connection.execute(f"SELECT * FROM {self._table(sheet_id)} WHERE _row = ?", (row_index,)).fetchone()
+        except sqlite3.Error as e:
+            st.error(f"Erro ao ler a linha {row_index_df} da aba '{worksheet_name}': {e}")
+            return None
+        if row is None:
+            return pd.Series(dtype=object)
+        return pd.Series(list(row[1:]), index=headers, name=row_index)
+
+    def read_cell(self, url, worksheet_name, row_index_df, col_name_df):
+        sheet_id = self._sheet_id(url, worksheet_name)
+        try:
+            row_index = int(row_index_df)
+        except (TypeError, ValueError):
+            st.error(f"Índice da linha inválido: {row_index_df}")
+            return None
+        try:
+            with self._connect() as connection:
+                if not self._sheet_exists(connection, sheet_id):
+                    self._missing_sheet(url, worksheet_name)
+                    return None
+                headers = self._headers(connection, sheet_id)
+                if col_name_df not in headers:
+                    st.error(f"Coluna '{col_name_df}' não encontrada nos cabeçalhos: {headers}")
+                    return None
+                column = self._column(headers.index(col_name_df) + 1)
+                row = connection.execute(f"SELECT {column} FROM {self._table(sheet_id)} WHERE _row = ?", (row_index,)).fetchone()
+        except sqlite3.Error as e:
+            st.error(f"Erro ao ler a célula '{col_name_df}' da linha {row_index_df} na aba '{worksheet_name}': {e}")
+            return None
+        return row[0] if row is not None else ""
+
+    def iter_chunks(self, url, worksheet_name, rows_per_chunk):
+        sheet_id = self._sheet_id(url, worksheet_name)
+        table = self._table(sheet_id)
+        try:
+            with self._connect() as connection:
+                if not self._sheet_exists(connection, sheet_id):
+                    self._missing_sheet(url, worksheet_name)
+                    yield None
+                    return
+                headers = self._headers(connection, sheet_id)
+                (last_row,) = connection.execute(f"SELECT MAX(_row) FROM {table}").fetchone()
+            if not headers:
+                st.warning(f"A aba '{worksheet_name}' em {url} não contém cabeçalhos.")
+                return
+            for first in range(0, (last_row if last_row is not None else -1) + 1, rows_per_chunk):
+                stop = min(first + rows_per_chunk, last_row + 1)
+                with self._connect() as connection: # A conexão não fica aberta entre um bloco e outro
+                    rows = connection.execute(
+                        f"SELECT * FROM {table} WHERE _row >= ? AND _row < ? ORDER BY _row", (first, stop)
+                    ).fetchall()
+                chunk = pd.DataFrame([row[1:] for row in rows], columns=headers, index=[row[0] for row in rows], dtype=object)
+                yield chunk.reindex(range(first, stop), fill_value="")
+        except sqlite3.Error as e:
+            st.error(f"Erro ao ler a aba '{worksheet_name}' em blocos: {e}")
+            yield None
+
+    def write_dataframe(self, url, worksheet_name, dataframe):
+        sheet_id = self._sheet_id(url, worksheet_name)
+        table = self._table(sheet_id)
+        headers = [_to_text(col) for col in dataframe.columns]
+        columns = [self._column(position) for position in range(1, len(headers) + 1)]
+        try:
+            with self._write_lock, self._connect() as connection:
+                connection.execute(f"DROP TABLE IF EXISTS {table}")
+                connection.execute("DELETE FROM sheet_headers WHERE sheet = ?", (sheet_id,))
+                column_defs = "".join(f", {col} TEXT NOT NULL DEFAULT ''" for col in columns)
+                connection.execute(f"CREATE TABLE {table} (_row INTEGER PRIMARY KEY{column_defs})")
+                connection.executemany(
+                    "INSERT INTO sheet_headers (sheet, position, name) VALUES (?, ?, ?)",
+                    [(sheet_id, position, name) for position, name in enumerate(headers, start=1)],
+                )
+                placeholders = ", ".join("?" * (len(columns) + 1))
+                connection.executemany(
+                    f"INSERT INTO {table} (_row{''.join(', ' + col for col in columns)}) VALUES ({placeholders})",
+                    [[position] + [_to_text(value) for value in row]
+                     for position, row in enumerate(dataframe.itertuples(index=False, name=None))],
+                )
+                self._bump_revision(connection, url)
+            return True
+        except sqlite3.Error as e:
+            st.error(f"Erro ao escrever DataFrame na aba '{worksheet_name}': {e}")
+            return False
+
+    def append_rows(self, url, worksheet_name, rows):
+        sheet_id = self._sheet_id(url, worksheet_name)
+        table = self._table(sheet_id)
+        try:
+            with self._write_lock, self._connect() as connection:
+                if not self._sheet_exists(connection, sheet_id):
+                    self._missing_sheet(url, worksheet_name)
+                    return None
+                headers = self._headers(connection, sheet_id)
+                self._add_columns(connection, sheet_id, headers, max(len(row) for row in rows))
+                (last_row,) = connection.execute(f"SELECT MAX(_row) FROM {table}").fetchone()
+                first = 0 if last_row is None else last_row + 1
+                for offset, row in enumerate(rows):
+                    columns = [self._column(position) for position in range(1, len(row) + 1)]
+                    connection.execute(
+                        f"INSERT INTO {table} (_row{''.join(', ' + col for col in columns)}) "
+                        f"VALUES (?{', ?' * len(columns)})",
+                        [first + offset] + [_to_text(value) for value in row],
+                    )
+                self._bump_revision(connection, url)
+            return [first + offset + 2 for offset in range(len(rows))] # +2: cabeçalho e base 1
+        except sqlite3.Error as e:
+            st.error(f"Erro ao adicionar linhas na aba '{worksheet_name}': {e}")
+            return None
+
+    def update_cells(self, url, worksheet_name, updates, value_input_option="USER_ENTERED"):
+        updates = list(updates) # O SQLite guarda tudo como texto: value_input_option não se aplica
+        results = [CellUpdateResult(row_key, col_name) for row_key, col_name, _ in updates]
+        if not updates:
+            return results
+        sheet_id = self._sheet_id(url, worksheet_name)
+        table = self._table(sheet_id)
+        try:
+            with self._write_lock, self._connect() as connection:
+                if not self._sheet_exists(connection, sheet_id):
+                    for result in results:
+                        result.error = f"Não foi possível obter a aba '{worksheet_name}' para atualização."
+                    return results
+                headers = self._headers(connection, sheet_id)
+                applied = []
+                for result, (row_key, col_name, new_value) in zip(results, updates):
+                    if col_name not in headers:
+                        result.error = f"Coluna '{col_name}' não encontrada nos cabeçalhos."
+                        continue
+                    try:
+                        row_index = int(row_key)
+                    except (TypeError, ValueError):
+                        result.error = f"Índice da linha inválido: {row_key}"
+                        continue
+                    column = self._column(headers.index(col_name) + 1)
+                    connection.execute(
+                        f"INSERT INTO {table} (_row, {column}) VALUES (?, ?) "
+                        f"ON CONFLICT(_row) DO UPDATE SET {column} = excluded.{column}",
+                        (row_index, _to_text(new_value)),
+                    )
+                    applied.append(result)
+                if applied:
+                    self._bump_revision(connection, url)
+            for result in applied:
+                result.ok = True
+        except sqlite3.Error as e:
+            for result in results:
+                if result.error is None:
+                    result.error = f"Erro na atualização em lote da aba '{worksheet_name}': {e}"
+        return results
+
+    def update_cell(self, url, worksheet_name, df_reference_for_headers, row_index_df, col_name_df, new_value):
+        if df_reference_for_headers is not None:
+            headers = df_reference_for_headers.columns.tolist()
+            if col_name_df not in headers:
+                st.error(f"Coluna '{col_name_df}' não encontrada nos cabeçalhos: {headers}")
+                return False
+        result = self.update_cells(url, worksheet_name, [(row_index_df, col_name_df, new_value)])[0]
+        if not result:
+            st.error(result.error)
+        return result.ok
@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+
+from utils.google_drive import get_drive_service
+from utils.google_sheets import SNAPSHOT_TTL_SECONDS, get_gspread_client, get_sheet_snapshot
+from utils.rate_limit import PRIORITY_BACKGROUND, request_priority
+from utils.schemas import CRONOGRAMA_SHEET_NAME, DASHBOARD_SCHEMA, USERS_SCHEMA, USERS_SHEET_NAME
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (em segundos) entre as verificações do aquecedor
+WARMUP_INTERVAL_SECONDS = 30
+# Antecedência (em segundos) com que um snapshot é revalidado antes de vencer o SNAPSHOT_TTL_SECONDS
+WARMUP_MARGIN_SECONDS = 60
+
+_lock = threading.Lock()
+_workers = {} # url da planilha -> thread do aquecedor
+
+
+def _warm_targets():
+    """(aba, kwargs de get_sheet_snapshot) mantidos quentes: os mesmos usados por app.py e pages/auth.py."""
+    return [
+        (CRONOGRAMA_SHEET_NAME, {"schema": DASHBOARD_SCHEMA}),
+        (USERS_SHEET_NAME, {"schema": USERS_SCHEMA, "persist": False}), # Contém senhas: não vai para o disco
+    ]
+
+def warm_caches(spreadsheet_url):
+    """
+    Autoriza os clientes (gspread e Drive) e revalida os snapshots que estão a menos de
+    WARMUP_MARGIN_SECONDS de vencer. Snapshots ainda novos não geram nenhuma requisição.
+    """
+    get_gspread_client()
+    get_drive_service()
+    for worksheet_name, kwargs in _warm_targets():
+        get_sheet_snapshot(spreadsheet_url, worksheet_name, max_age=SNAPSHOT_TTL_SECONDS - WARMUP_MARGIN_SECONDS, **kwargs)
+
+def _worker_loop(spreadsheet_url):
+    with request_priority(PRIORITY_BACKGROUND): # Sessões de usuários têm preferência na cota
+        while True:
+            try:
+                warm_caches(spreadsheet_url)
+            except Exception as e:
+                logger.warning("Falha ao aquecer os caches: %s", e)
+            time.sleep(WARMUP_INTERVAL_SECONDS)
+
+def start_cache_warmer(spreadsheet_url):
+    """
+    Inicia (uma vez por processo) a thread que aquece os clientes e os snapshots da planilha
+    logo após o início do servidor e os revalida antes do vencimento, para que as sessões
+    dos usuários sempre encontrem o cache pronto. Chamadas repetidas não fazem nada.
+    """
+    with _lock:
+        worker = _workers.get(spreadsheet_url)
+        if worker is not None and worker.is_alive():
+            return
+        worker = threading.Thread(target=_worker_loop, args=(spreadsheet_url,), name="cache-warmer", daemon=True)
+        _workers[spreadsheet_url] = worker
+        worker.start()
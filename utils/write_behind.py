@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+
+from utils.google_sheets import spreadsheet_key, update_cells_batch
+from utils.rate_limit import PRIORITY_BACKGROUND, request_priority
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (em segundos) entre as gravações em lote feitas pelo worker em segundo plano
+FLUSH_INTERVAL_SECONDS = 2.0
+# Por quanto tempo o status "salvo" de uma célula continua disponível para a interface
+SAVED_STATUS_TTL_SECONDS = 600
+
+STATUS_PENDING = "pending"
+STATUS_SAVED = "saved"
+STATUS_FAILED = "failed"
+
+# Fila em memória do processo: uma entrada por célula, de modo que edições repetidas
+# na mesma célula se mesclam e apenas o último valor é enviado.
+_pending = {}  # (chave_planilha, aba, row_key, coluna) -> (url, valor)
+_status = {}   # (chave_planilha, aba, row_key, coluna) -> (status, erro, momento)
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_worker = None
+
+
+def _cell_key(url, worksheet_name, row_key, col_name):
+    return (spreadsheet_key(url), worksheet_name, row_key, col_name)
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_worker_loop, name="sheets-write-behind", daemon=True)
+        _worker.start()
+
+def _worker_loop():
+    with request_priority(PRIORITY_BACKGROUND): # Leituras dos usuários têm preferência na cota
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            try:
+                flush_pending_updates()
+            except Exception as e:
+                logger.warning("Falha ao gravar a fila de atualizações: %s", e)
+
+def enqueue_cell_update(url, worksheet_name, row_key, col_name, new_value):
+    """
+    Enfileira a atualização de uma célula para gravação em segundo plano e retorna imediatamente.
+    row_key é o ID da linha ou o índice 0-based do DataFrame (mesma convenção de update_cells_batch).
+    """
+    cell_key = _cell_key(url, worksheet_name, row_key, col_name)
+    with _lock:
+        _pending[cell_key] = (url, new_value)
+        _status[cell_key] = (STATUS_PENDING, None, time.monotonic())
+    _ensure_worker()
+
+def get_cell_update_status(url, worksheet_name, row_key, col_name):
+    """Retorna (status, erro) da última edição enfileirada para a célula, ou (None, None)."""
+    status, error, _ = _status.get(_cell_key(url, worksheet_name, row_key, col_name), (None, None, None))
+    return status, error
+
+def get_pending_value(url, worksheet_name, row_key, col_name, default=None):
+    """Valor ainda não gravado da célula (para exibir a edição do usuário antes da gravação)."""
+    entry = _pending.get(_cell_key(url, worksheet_name, row_key, col_name))
+    return entry[1] if entry is not None else default
+
+def flush_pending_updates():
+    """
+    Grava todas as edições pendentes, com uma requisição em lote por aba.
+    Chamada periodicamente pelo worker; pode ser chamada diretamente para forçar a gravação.
+    """
+    with _flush_lock:
+        with _lock:
+            batch = dict(_pending)
+            _pending.clear()
+        if not batch:
+            return
+
+        by_worksheet = {}
+        for cell_key, (url, new_value) in batch.items():
+            by_worksheet.setdefault((cell_key[0], cell_key[1]), (url, []))[1].append((cell_key, new_value))
+
+        for (_, worksheet_name), (url, cells) in by_worksheet.items():
+            results = update_cells_batch(url, worksheet_name, [(key[2], key[3], value) for key, value in cells])
+            now = time.monotonic()
+            with _lock:
+                for (cell_key, _), result in zip(cells, results):
+                    if cell_key in _pending:
+                        continue # Nova edição chegou durante a gravação; o status continua pendente
+                    _status[cell_key] = (STATUS_SAVED if result else STATUS_FAILED, result.error, now)
+
+        with _lock:
+            expired = [key for key, (status, _, moment) in _status.items()
+                       if status == STATUS_SAVED and time.monotonic() - moment > SAVED_STATUS_TTL_SECONDS]
+            for key in expired:
+                _status.pop(key, None)